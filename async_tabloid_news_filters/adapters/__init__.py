@@ -0,0 +1,34 @@
+import functools
+import importlib
+from urllib.parse import urlparse
+from .exceptions import UnsupportedDomainError
+
+ADAPTERS = {
+    'inosmi.ru': 'inosmi_ru',
+}
+
+GENERIC_ADAPTER = 'generic'
+
+
+def get_adapter(url, use_generic=False):
+    """Find the adapter module for url's host before anything is downloaded.
+
+    Subdomains are served by their parent domain's adapter. Unknown hosts
+    get the generic adapter if it is switched on."""
+    host = urlparse(url).hostname or ''
+    for domain, module_name in ADAPTERS.items():
+        if host == domain or host.endswith(f'.{domain}'):
+            return _load_adapter(module_name)
+    if use_generic:
+        return _load_adapter(GENERIC_ADAPTER)
+    raise UnsupportedDomainError(host)
+
+
+def get_adapter_by_name(module_name):
+    """Adapter module by name, for articles that come without a url."""
+    return _load_adapter(module_name)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_adapter(module_name):
+    return importlib.import_module(f'.{module_name}', __name__)
@@ -1,2 +1,6 @@
 class ArticleNotFoundError(Exception):
     pass
+
+
+class UnsupportedDomainError(ArticleNotFoundError):
+    pass
@@ -0,0 +1,41 @@
+from collections import defaultdict
+from bs4 import BeautifulSoup
+from .exceptions import ArticleNotFoundError
+from .html_tools import FAST_PARSER
+
+NOISE_TAGS = [
+    'script',
+    'style',
+    'noscript',
+    'nav',
+    'header',
+    'footer',
+    'aside',
+    'form',
+    'time',
+]
+
+MIN_ARTICLE_LENGTH = 250
+
+
+def extract_article_plaintext(html):
+    """Readability-style guess: the block holding most paragraph text wins."""
+    soup = BeautifulSoup(html, FAST_PARSER)
+    for tag in soup.find_all(NOISE_TAGS):
+        tag.decompose()
+
+    containers = dict()
+    text_lengths = defaultdict(int)
+    for paragraph in soup.find_all('p'):
+        container = paragraph.parent
+        containers[id(container)] = container
+        text_lengths[id(container)] += len(paragraph.get_text(strip=True))
+
+    if not text_lengths:
+        raise ArticleNotFoundError()
+    best = max(text_lengths, key=text_lengths.get)
+    if text_lengths[best] < MIN_ARTICLE_LENGTH:
+        raise ArticleNotFoundError()
+
+    text = containers[best].get_text(' ')
+    return text.strip().replace(u'\xa0', u' ')
@@ -1,3 +1,9 @@
+try:
+    import lxml  # noqa: F401
+    FAST_PARSER = 'lxml'
+except ImportError:
+    FAST_PARSER = 'html.parser'
+
 DEFAULT_BLACKLIST_TAGS = [
     'script',
     'time',
@@ -35,7 +41,7 @@ def remove_buzz_tags(soup):
     """Remove most of tags, leaves only tags significant for text analysis."""
     blacklist = DEFAULT_BLACKLIST_TAGS
     unwraplist = DEFAULT_UNWRAPLIST_TAGS
-    for tag in soup.find_all(True):
+    for tag in soup.find_all(blacklist + unwraplist):
         if tag.name in blacklist:
             tag.decompose()
         elif tag.name in unwraplist:
@@ -1,6 +1,18 @@
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from .exceptions import ArticleNotFoundError
 from .html_tools import remove_buzz_attrs, remove_buzz_tags, remove_all_tags
+from .html_tools import DEFAULT_BLACKLIST_TAGS, FAST_PARSER
+
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
+
+BUZZ_SELECTORS = [
+    '.article-disclaimer',
+    'footer.article-footer',
+    'aside',
+]
 
 
 def sanitize_article_text(html, plaintext=False):
@@ -13,11 +25,8 @@ def sanitize_article_text(html, plaintext=False):
     article = articles[0]
     article.attrs = {}
 
-    buzz_blocks = [
-        *article.select('.article-disclaimer'),
-        *article.select('footer.article-footer'),
-        *article.select('aside'),
-    ]
+    buzz_blocks = [el for selector in BUZZ_SELECTORS
+                   for el in article.select(selector)]
     for el in buzz_blocks:
         el.decompose()
 
@@ -33,3 +42,40 @@ def sanitize_article_text(html, plaintext=False):
     text = text.strip()
     text = text.replace(u'\xa0', u' ')
     return text
+
+
+def extract_article_plaintext(html):
+    """Fast path for text analysis: only the article text, no markup.
+
+    Parses just the article.article subtree and skips attribute and tag
+    rewriting. Uses selectolax or lxml when installed."""
+    if HTMLParser is not None:
+        text = _extract_with_selectolax(html)
+    else:
+        text = _extract_with_soup(html)
+    return text.strip().replace(u'\xa0', u' ')
+
+
+def _extract_with_selectolax(html):
+    articles = HTMLParser(html).css('article.article')
+    if len(articles) != 1:
+        raise ArticleNotFoundError()
+
+    article = articles[0]
+    selectors = ', '.join(BUZZ_SELECTORS + DEFAULT_BLACKLIST_TAGS)
+    for el in article.css(selectors):
+        el.decompose()
+    return article.text(separator=' ')
+
+
+def _extract_with_soup(html):
+    only_articles = SoupStrainer('article', class_='article')
+    soup = BeautifulSoup(html, FAST_PARSER, parse_only=only_articles)
+    articles = soup.select("article.article")
+    if len(articles) != 1:
+        raise ArticleNotFoundError()
+
+    article = articles[0]
+    for el in article.select(', '.join(BUZZ_SELECTORS + DEFAULT_BLACKLIST_TAGS)):
+        el.decompose()
+    return article.get_text(' ')
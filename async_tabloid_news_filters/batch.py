@@ -0,0 +1,326 @@
+"""Offline batch scoring of article urls or local HTML files, no HTTP server.
+
+Arguments after -- go to the service pipeline, see main.py -h:
+
+    python batch.py urls.txt -output scores.jsonl
+    cat urls.txt | python batch.py - -output scores.csv -concurrency 50
+    python batch.py archive/ -output scores.jsonl -resume -- -use_generic_adapter
+"""
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from urllib.parse import urlparse
+from aiohttp import web
+
+from adapters import ADAPTERS, GENERIC_ADAPTER
+from adapters import get_adapter_by_name
+from adapters.exceptions import ArticleNotFoundError
+from main import analyze_article_html
+from main import create_app
+from main import load_dictionaries
+from main import process_article_within_limits
+from main import serialize_result
+from tools.helpers import ArticleTooLargeError
+from tools.helpers import PhaseTimeoutError
+from tools.helpers import ProcessingStatus
+from tools.helpers import create_handy_nursery
+from tools.helpers import get_args_parser
+from tools.helpers import get_deadline
+from tools.helpers import normalize_url
+
+RESULT_FIELDS = ['url', 'status', 'score', 'words_count', 'timeout_phase']
+HTML_EXTENSIONS = ('.html', '.htm')
+READ_CHUNK_SIZE = 1000
+
+
+def get_batch_args_parser():
+    formatter_class = argparse.ArgumentDefaultsHelpFormatter
+    parser = argparse.ArgumentParser(
+        prog='python batch.py', formatter_class=formatter_class,
+        epilog='Arguments after -- are passed to the service, see main.py -h')
+    parser.add_argument('input', nargs='?', default='-',
+                        help='File with an url or an HTML file path per line, '
+                             'folder with HTML files or - for stdin')
+    parser.add_argument('-output', default='-',
+                        help='Results file or - for stdout')
+    parser.add_argument('-format', choices=['jsonl', 'csv'],
+                        help='Results format, by default from -output '
+                             'extension, jsonl for stdout')
+    parser.add_argument('-concurrency', type=int, default=20,
+                        help='Articles fetched and processed at once')
+    parser.add_argument('-cpu_workers', type=int, default=os.cpu_count(),
+                        help='Processes for HTML parsing and text analysis, '
+                             '0 runs them in the event loop')
+    parser.add_argument('-adapter', default='inosmi_ru',
+                        choices=sorted({*ADAPTERS.values(), GENERIC_ADAPTER}),
+                        help='Adapter for local HTML files')
+    parser.add_argument('-resume', action='store_true',
+                        help='Skip articles already in -output and append')
+    parser.add_argument('-progress_interval', type=float, default=5,
+                        help='Progress report interval, sec')
+    return parser
+
+
+def get_output_format(args):
+    if args.format:
+        return args.format
+    return 'csv' if args.output.lower().endswith('.csv') else 'jsonl'
+
+
+def is_url(item):
+    return urlparse(item).scheme in ('http', 'https')
+
+
+def iter_folder_files(folder):
+    for dirpath, dirnames, filenames in os.walk(folder):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(HTML_EXTENSIONS):
+                yield os.path.join(dirpath, filename)
+
+
+def read_lines_chunk(input_file):
+    return list(itertools.islice(input_file, READ_CHUNK_SIZE))
+
+
+async def iter_input_items(path):
+    """Yields urls and file paths, input file is read without blocking
+    the event loop."""
+    if path != '-' and os.path.isdir(path):
+        for filepath in iter_folder_files(path):
+            yield filepath
+        return
+
+    loop = asyncio.get_running_loop()
+    input_file = sys.stdin if path == '-' else open(path, encoding='utf8')
+    try:
+        while lines := await loop.run_in_executor(None, read_lines_chunk,
+                                                   input_file):
+            for line in lines:
+                item = line.strip()
+                if item and not item.startswith('#'):
+                    yield normalize_url(item) if is_url(item) else item
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+
+
+def read_done_items(output_path, output_format):
+    """Articles with complete records in an earlier output, for -resume."""
+    if output_path == '-' or not os.path.exists(output_path):
+        return set()
+    done_items = set()
+    with open(output_path, encoding='utf8', newline='') as f:
+        if output_format == 'csv':
+            for row in csv.DictReader(f):
+                if row.get(RESULT_FIELDS[-1]) is not None:
+                    done_items.add(row['url'])
+            return done_items
+        for line in f:
+            try:
+                record = json.loads(line)
+                if 'status' in record:
+                    done_items.add(record['url'])
+            except (ValueError, TypeError, KeyError):
+                continue
+    return done_items
+
+
+class ResultWriter:
+    """Writes each result as soon as it is ready, as JSONL or CSV."""
+
+    def __init__(self, output_file, output_format, write_header=True):
+        self._output_file = output_file
+        self._csv_writer = None
+        if output_format == 'csv':
+            self._csv_writer = csv.DictWriter(output_file, RESULT_FIELDS)
+            if write_header:
+                self._csv_writer.writeheader()
+
+    def write(self, result):
+        if self._csv_writer is not None:
+            self._csv_writer.writerow(result)
+        else:
+            self._output_file.write(json.dumps(result, ensure_ascii=False))
+            self._output_file.write('\n')
+        self._output_file.flush()
+
+
+def truncate_partial_record(output_path, chunk_size=64 * 1024):
+    """Cuts off the last line if it was not written completely."""
+    with open(output_path, 'rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - chunk_size)
+            f.seek(start)
+            chunk = f.read(position - start)
+            if start + len(chunk) == end and chunk.endswith(b'\n'):
+                return
+            newline_at = chunk.rfind(b'\n')
+            if newline_at != -1:
+                f.truncate(start + newline_at + 1)
+                return
+            position = start
+        f.truncate(0)
+
+
+def open_output(output_path, append):
+    """Returns the output file and whether it already has records."""
+    if output_path == '-':
+        return sys.stdout, False
+    if append and os.path.exists(output_path):
+        truncate_partial_record(output_path)
+    has_records = append and os.path.exists(output_path) and \
+        os.path.getsize(output_path) > 0
+    output_file = open(output_path, 'a' if append else 'w', encoding='utf8',
+                       newline='')
+    return output_file, has_records
+
+
+class Progress:
+
+    def __init__(self, skipped=0):
+        self.started = time.monotonic()
+        self.skipped = skipped
+        self.statuses = Counter()
+
+    def add(self, status):
+        self.statuses[status.value] += 1
+
+    def report(self):
+        processed = sum(self.statuses.values())
+        rate = processed / max(time.monotonic() - self.started, 1e-9)
+        logging.info(f' Processed {processed} ({rate:.1f}/sec), skipped '
+                     f'{self.skipped}: {dict(self.statuses)}')
+
+    async def report_every(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            self.report()
+
+
+def read_html_file(filepath):
+    with open(filepath, encoding='utf8', errors='replace') as f:
+        return f.read()
+
+
+async def process_article_file(app, adapter, filepath, deadline):
+    jaundice_rate = word_count = timeout_phase = None
+    try:
+        status = ProcessingStatus.OK
+        max_bytes = app['max_article_bytes']
+        if max_bytes and os.path.getsize(filepath) > max_bytes:
+            raise ArticleTooLargeError(filepath)
+        loop = asyncio.get_running_loop()
+        html = await loop.run_in_executor(None, read_html_file, filepath)
+        _, (jaundice_rate, word_count) = await analyze_article_html(
+            app, adapter, html, deadline)
+    except OSError:
+        status = ProcessingStatus.FETCH_ERROR
+    except ArticleNotFoundError:
+        status = ProcessingStatus.PARSING_ERROR
+    except ArticleTooLargeError:
+        status = ProcessingStatus.TOO_LARGE
+    except PhaseTimeoutError as error:
+        status = ProcessingStatus.TIMEOUT
+        timeout_phase = error.phase
+    return filepath, status, jaundice_rate, word_count, timeout_phase
+
+
+async def process_item(app, adapter, item):
+    deadline = get_deadline(app['timeouts'].request)
+    if is_url(item):
+        return await process_article_within_limits(app, item, deadline)
+    try:
+        return await process_article_file(app, adapter, item, deadline)
+    except Exception:
+        logging.exception(f' Unexpected error on {item}')
+        return item, ProcessingStatus.PARSING_ERROR, None, None, None
+
+
+async def process_items(app, adapter, items, writer, progress, concurrency):
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def process_queue():
+        while (item := await queue.get()) is not None:
+            result = await process_item(app, adapter, item)
+            writer.write(serialize_result(result))
+            progress.add(result[1])
+
+    async with create_handy_nursery() as nursery:
+        for _ in range(concurrency):
+            nursery.start_soon(process_queue())
+        async for item in items:
+            await queue.put(item)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+
+async def skip_items(items, skipped_items, progress):
+    """Drops repeated articles and the ones in skipped_items."""
+    seen_items = set(skipped_items)
+    async for item in items:
+        if item in seen_items:
+            progress.skipped += 1
+            continue
+        seen_items.add(item)
+        yield item
+
+
+async def run_batch(args, service_args):
+    output_format = get_output_format(args)
+    done_items = set()
+    if args.resume:
+        done_items = read_done_items(args.output, output_format)
+    charged_words, morph = load_dictionaries(service_args, dict())
+    app = create_app(service_args, charged_words, morph)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    output_file, has_records = open_output(args.output, args.resume)
+    progress = Progress()
+    reporter = asyncio.ensure_future(
+        progress.report_every(args.progress_interval))
+    try:
+        writer = ResultWriter(output_file, output_format,
+                              write_header=not has_records)
+        adapter = get_adapter_by_name(args.adapter)
+        items = skip_items(iter_input_items(args.input), done_items, progress)
+        await process_items(app, adapter, items, writer, progress,
+                            args.concurrency)
+    finally:
+        reporter.cancel()
+        if output_file is not sys.stdout:
+            output_file.close()
+        await runner.cleanup()
+    progress.report()
+    return progress
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger('pymorphy2.opencorpora_dict.wrapper').setLevel(logging.ERROR)
+    parser = get_batch_args_parser()
+    argv, service_argv = sys.argv[1:], []
+    if '--' in argv:
+        separator_at = argv.index('--')
+        argv, service_argv = argv[:separator_at], argv[separator_at + 1:]
+    args = parser.parse_args(argv)
+    if args.resume and args.output == '-':
+        parser.error('-resume needs an -output file')
+    service_args = get_args_parser().parse_args(
+        ['-result_log_rate', '0'] + service_argv)
+    service_args.max_concurrency = args.concurrency
+    service_args.morph_workers = args.cpu_workers
+    asyncio.run(run_batch(args, service_args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""Offline benchmarks: text tools throughput and end-to-end service latency.
+
+Run from the project folder, arguments after -- go to the service:
+
+    python -m benchmarks.run -concurrency 1 10 50 -- -morph_workers 4
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import subprocess
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from aiohttp import ClientSession
+from aiohttp.test_utils import TestServer
+
+import adapters
+from adapters.inosmi_ru import extract_article_plaintext
+from adapters.inosmi_ru import sanitize_article_text
+from benchmarks.stub_server import FIXTURES_FOLDER
+from benchmarks.stub_server import create_stub_app
+from benchmarks.stub_server import load_corpus
+from main import create_app
+from tools.helpers import get_args_parser
+from tools.text_tools import ChargedDictionary
+from tools.text_tools import calculate_jaundice_rate
+from tools.text_tools import configure_lemma_cache
+from tools.text_tools import get_morph_analyzer
+from tools.text_tools import split_by_words
+
+STUB_HOST = '127.0.0.1'
+
+
+def get_benchmark_args_parser():
+    formatter_class = argparse.ArgumentDefaultsHelpFormatter
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.run', formatter_class=formatter_class,
+        epilog='Arguments after -- are passed to the service, see main.py -h')
+    parser.add_argument('-fixtures', default=FIXTURES_FOLDER,
+                        help='Folder with article HTML files')
+    parser.add_argument('-latency', type=float, default=0.05,
+                        help='Stub server response delay, sec')
+    parser.add_argument('-jitter', type=float, default=0.0,
+                        help='Random extra stub server delay up to, sec')
+    parser.add_argument('-concurrency', type=int, nargs='+',
+                        default=[1, 10, 50],
+                        help='Concurrent client requests levels')
+    parser.add_argument('-requests', type=int, default=200,
+                        help='Requests per concurrency level')
+    parser.add_argument('-min_time', type=float, default=1.0,
+                        help='Min run time of each text tools benchmark, sec')
+    parser.add_argument('-skip_text_tools', action='store_true',
+                        help='Run only end-to-end benchmark')
+    parser.add_argument('-skip_end_to_end', action='store_true',
+                        help='Run only text tools benchmarks')
+    parser.add_argument('-output', default='benchmark_results.json',
+                        help='JSON file for results')
+    return parser
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of values."""
+    ordered = sorted(values)
+    rank = max(1, round(percent / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def get_git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            check=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def measure_throughput(function, items, min_time):
+    """Calls function over items in rounds until min_time has passed.
+
+    Returns calls per second and the duration of the run."""
+    calls = 0
+    started = time.perf_counter()
+    while True:
+        for item in items:
+            result = function(item)
+            if asyncio.iscoroutine(result):
+                await result
+        calls += len(items)
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            return calls / elapsed, elapsed
+
+
+async def benchmark_text_tools(corpus, morph, charged_words, min_time):
+    htmls = list(corpus.values())
+    corpus_bytes = sum(len(html.encode()) for html in htmls)
+    texts = [extract_article_plaintext(html) for html in htmls]
+    configure_lemma_cache()
+    words = [await split_by_words(morph, text) for text in texts]
+    words_per_article = sum(map(len, words)) / len(words)
+
+    def get_html_results(calls_per_sec, elapsed):
+        return {
+            'articles_per_sec': round(calls_per_sec, 2),
+            'mb_per_sec': round(
+                calls_per_sec * corpus_bytes / len(htmls) / 2**20, 2),
+            'seconds': round(elapsed, 3)}
+
+    results = dict()
+    results['extract_article_plaintext'] = get_html_results(
+        *await measure_throughput(extract_article_plaintext, htmls, min_time))
+    results['sanitize_article_text'] = get_html_results(
+        *await measure_throughput(
+            lambda html: sanitize_article_text(html, plaintext=True), htmls,
+            min_time))
+
+    calls_per_sec, elapsed = await measure_throughput(
+        lambda text: split_by_words(morph, text), texts, min_time)
+    results['split_by_words'] = {
+        'articles_per_sec': round(calls_per_sec, 2),
+        'words_per_sec': round(calls_per_sec * words_per_article),
+        'seconds': round(elapsed, 3)}
+
+    calls_per_sec, elapsed = await measure_throughput(
+        lambda article_words: calculate_jaundice_rate(article_words,
+                                                      charged_words),
+        words, min_time)
+    results['calculate_jaundice_rate'] = {
+        'articles_per_sec': round(calls_per_sec, 2),
+        'words_per_sec': round(calls_per_sec * words_per_article),
+        'seconds': round(elapsed, 3)}
+    return results
+
+
+async def run_requests(session, service_url, article_urls, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = list()
+    statuses = Counter()
+
+    async def request(article_url):
+        async with semaphore:
+            started = time.perf_counter()
+            async with session.get(service_url,
+                                   params={'urls': article_url}) as response:
+                results = await response.json()
+            latencies.append(time.perf_counter() - started)
+            statuses.update(result['status'] for result in results)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[request(article_url)
+                           for article_url in article_urls])
+    return time.perf_counter() - started, latencies, statuses
+
+
+async def benchmark_end_to_end(args, service_args, corpus, morph,
+                               charged_words):
+    adapters.ADAPTERS.setdefault(STUB_HOST, 'inosmi_ru')
+    stub_server = TestServer(create_stub_app(corpus, args.latency,
+                                             args.jitter), host=STUB_HOST)
+    service = TestServer(create_app(service_args, charged_words, morph))
+    await stub_server.start_server()
+    await service.start_server()
+    names = list(corpus)
+    request_numbers = itertools.count()
+
+    def make_article_urls(count):
+        """Every url is new, so the service can not share or cache work."""
+        return [str(stub_server.make_url(
+            f'/articles/{names[number % len(names)]}.html'
+            f'?n={next(request_numbers)}')) for number in range(count)]
+
+    results = list()
+    try:
+        async with ClientSession() as session:
+            service_url = str(service.make_url('/'))
+            await run_requests(session, service_url,
+                               make_article_urls(len(names)), 1)
+            for concurrency in args.concurrency:
+                elapsed, latencies, statuses = await run_requests(
+                    session, service_url, make_article_urls(args.requests),
+                    concurrency)
+                results.append({
+                    'concurrency': concurrency,
+                    'requests': len(latencies),
+                    'requests_per_sec': round(len(latencies) / elapsed, 2),
+                    'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+                    'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+                    'max_ms': round(max(latencies) * 1000, 2),
+                    'statuses': dict(statuses)})
+                logging.info(f' {results[-1]}')
+    finally:
+        await service.close()
+        await stub_server.close()
+    return results
+
+
+async def run_benchmarks(args, service_argv):
+    service_args = get_args_parser().parse_args(service_argv)
+    corpus = load_corpus(args.fixtures)
+    morph = get_morph_analyzer()
+    charged_words = ChargedDictionary.from_snapshot(
+        'charged_dict', service_args.charged_dict_snapshot, morph)
+    report = {
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'git_revision': get_git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'settings': {key: value for key, value in vars(args).items()
+                     if key != 'output'},
+        'service_args': service_argv,
+        'corpus': {name: len(html.encode()) for name, html in corpus.items()},
+    }
+    if not args.skip_text_tools:
+        report['text_tools'] = await benchmark_text_tools(
+            corpus, morph, charged_words, args.min_time)
+        logging.info(f' {report["text_tools"]}')
+    if not args.skip_end_to_end:
+        report['end_to_end'] = await benchmark_end_to_end(
+            args, service_args, corpus, morph, charged_words)
+    return report
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger('pymorphy2.opencorpora_dict.wrapper').setLevel(logging.ERROR)
+    logging.getLogger('aiohttp.access').setLevel(logging.WARNING)
+    parser = get_benchmark_args_parser()
+    args, service_argv = parser.parse_known_args()
+    if service_argv[:1] == ['--']:
+        service_argv = service_argv[1:]
+    service_argv = ['-result_log_rate', '0', '-host_rate', '0'] + service_argv
+    report = asyncio.run(run_benchmarks(args, service_argv))
+    with open(args.output, 'w', encoding='utf8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    logging.info(f' Results saved to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""Local stand-in for news sites: serves the stored article HTML corpus."""
+import asyncio
+import itertools
+import os
+import random
+from aiohttp import web
+
+FIXTURES_FOLDER = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def load_corpus(folder=FIXTURES_FOLDER):
+    """Returns {name: html} for every .html file in folder."""
+    corpus = dict()
+    for filename in sorted(os.listdir(folder)):
+        name, extension = os.path.splitext(filename)
+        if extension == '.html':
+            with open(os.path.join(folder, filename), encoding='utf8') as f:
+                corpus[name] = f.read()
+    return corpus
+
+
+def create_stub_app(corpus, latency=0.0, jitter=0.0, unique=True):
+    """Serves corpus at /articles/{name}.html after latency + up to jitter
+    seconds. With unique, every response gets a different number in the
+    article, so text hash caches of the service do not skip the analysis."""
+    response_numbers = itertools.count()
+
+    async def handle_article(request):
+        html = corpus.get(request.match_info['name'])
+        if html is None:
+            raise web.HTTPNotFound()
+        delay = latency + random.uniform(0, jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if unique:
+            html = html.replace('</article>',
+                                f'<p>{next(response_numbers)}</p></article>', 1)
+        return web.Response(text=html, content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/articles/{name}.html', handle_article)
+    return app
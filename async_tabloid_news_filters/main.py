@@ -1,99 +1,290 @@
 import asyncio
+import json
 import logging
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from functools import partial
-import async_timeout
-import pymorphy2
-from aiohttp import ClientSession, web
-from aiohttp.client_exceptions import ClientConnectorError, InvalidURL
+from urllib.parse import urlparse
+from aiohttp import web
+from aiohttp.client_exceptions import ClientError, InvalidURL
 
+from adapters import get_adapter
 from adapters.exceptions import ArticleNotFoundError
-from adapters.inosmi_ru import sanitize_article_text
+from tools.cache import ArticleCache
+from tools.cache import RevalidationCache
+from tools.cache import get_text_hash
+from tools.helpers import ArticleTooLargeError
+from tools.helpers import ConcurrencyLimiter
+from tools.helpers import HostRateLimiter
 from tools.helpers import ProcessingStatus
+from tools.helpers import RetryPolicy
+from tools.helpers import SingleFlight
+from tools.helpers import TransientFetchError
 from tools.helpers import UrlLimitError
+from tools.helpers import PhaseTimeoutError
+from tools.helpers import PhaseTimeouts
 from tools.helpers import create_handy_nursery
-from tools.helpers import measure_execution_time
-from tools.helpers import fetch
+from tools.helpers import create_http_session
+from tools.helpers import normalize_url
+from tools.helpers import phase_deadline
+from tools.helpers import fetch_page_with_retries
 from tools.helpers import get_args_parser
-from tools.helpers import get_charged_words
-from tools.helpers import read_from_cache, write_to_cache
-from tools.text_tools import calculate_jaundice_rate
-from tools.text_tools import split_by_words
+from tools.helpers import get_deadline
+from tools.helpers import get_remaining_time
+from tools.helpers import measure_time
+from tools.text_tools import ChargedDictionary
+from tools.text_tools import analyze_text_by_phases
+from tools.text_tools import analyze_text_by_phases_in_worker
+from tools.text_tools import analyze_text_in_worker
+from tools.text_tools import configure_lemma_cache
+from tools.text_tools import get_morph_analyzer
+from tools.text_tools import init_analysis_worker
+from tools.text_tools import lemma_cache_info
+from tools.text_tools import warm_up_lemma_cache
+from tools.metrics import METRICS_CONTENT_TYPE
+from tools.metrics import ServiceMetrics
+from tools.workers import WorkerPool
+from tools.workers import create_listening_socket
 
+MAX_RETRY_BACKOFF = 8
+STREAM_QUERY_VALUES = ('1', 'true')
+REFRESH_STATUSES = (ProcessingStatus.OK.value,
+                    ProcessingStatus.PARSING_ERROR.value)
 
-async def get_article_text_by_url(article_url, _timeout):
-    async with async_timeout.timeout(_timeout):
-        async with ClientSession() as session:
-            return await fetch(session, article_url)
+
+async def get_article_page_by_url(app, article_url, revalidation, deadline):
+    etag = last_modified = None
+    if revalidation:
+        etag, last_modified = revalidation.etag, revalidation.last_modified
+    return await fetch_page_with_retries(
+        app['http_session'], article_url, app['rate_limiter'],
+        app['retry_policy'], deadline, etag=etag, last_modified=last_modified,
+        max_bytes=app['max_article_bytes'])
+
+
+def serialize_result(raw_data_set):
+    _url, status, jaundice_rate, word_count, timeout_phase = raw_data_set
+    serialized_results_dict = ({'status': status.value,
+                                'url': _url,
+                                'score': jaundice_rate,
+                                'words_count': word_count})
+    if timeout_phase:
+        serialized_results_dict['timeout_phase'] = timeout_phase
+    return serialized_results_dict
 
 
 def serialize_results(raw_data_sets):
     for data_set in raw_data_sets:
-        _url, status, jaundice_rate, word_count = data_set.result()
-        serialized_results_dict = ({'status': status.value,
-                                    'url': _url,
-                                    'score': jaundice_rate,
-                                    'words_count': word_count})
-        logging.info(f' {serialized_results_dict=}')
-        yield serialized_results_dict
-
-
-async def process_article(article_url, charged_words, morph):
-    jaundice_rate = word_count = None
-    _timeout = 5
+        yield serialize_result(data_set.result())
+
+
+async def extract_article_text(app, adapter, html):
+    """Without a process pool the parsing goes to the default thread pool,
+    so the parse timeout can fire while it runs."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        app['executor'], adapter.extract_article_plaintext, html)
+
+
+async def analyze_article_text(app, text, _timeout):
+    deadline = time.time() + _timeout
+    executor = app['executor']
+    if executor is None:
+        analysis, timings = analyze_text_by_phases(
+            app['morph'], app['charged_words'], text, deadline)
+    else:
+        loop = asyncio.get_running_loop()
+        analysis, timings = await loop.run_in_executor(
+            executor, analyze_text_by_phases_in_worker, text, deadline)
+    for phase, seconds in timings.items():
+        app['metrics'].phase_seconds.observe(seconds, phase=phase)
+    return analysis
+
+
+async def analyze_article_html(app, adapter, html, deadline):
+    """Returns the article text hash and (jaundice rate, words count).
+
+    Articles with the same text are analyzed once."""
+    timeouts = app['timeouts']
+    async with phase_deadline('parse', timeouts.parse, deadline):
+        with app['metrics'].phase_seconds.time(phase='parse'):
+            clean_text = await extract_article_text(app, adapter, html)
+    text_hash = get_text_hash(clean_text)
+    revalidation_cache = app['revalidation_cache']
+    analysis = revalidation_cache.get_analysis(text_hash)
+    if analysis is None:
+        async with phase_deadline('analysis', timeouts.analysis,
+                                  deadline) as _timeout:
+            analysis = await analyze_article_text(app, clean_text, _timeout)
+        revalidation_cache.set_analysis(text_hash, analysis)
+    return text_hash, analysis
+
+
+async def process_article(app, article_url, deadline):
+    """Each phase has its own timeout, cut by the remaining request budget.
+
+    With an executor, parsing and analysis run in worker processes, so a
+    timed out phase frees the event loop at once; analysis also checks its
+    deadline and stops early."""
+    jaundice_rate = word_count = timeout_phase = None
     try:
         status = ProcessingStatus.OK
-        html_content = await get_article_text_by_url(article_url, _timeout)
-        clean_text = sanitize_article_text(html_content)
-        async with measure_execution_time(_timeout):
-            async with async_timeout.timeout(_timeout):
-                article_words = await split_by_words(morph, clean_text)
-        jaundice_rate = calculate_jaundice_rate(article_words, charged_words)
-        word_count = len(article_words)
-    except (ClientConnectorError, InvalidURL):
+        if not urlparse(article_url).hostname:
+            raise InvalidURL(article_url)
+        adapter = get_adapter(article_url, app['use_generic_adapter'])
+        revalidation_cache = app['revalidation_cache']
+        revalidation = revalidation_cache.get_revalidation(article_url)
+        async with phase_deadline('fetch', app['timeouts'].fetch,
+                                  deadline) as _timeout:
+            with app['metrics'].phase_seconds.time(phase='fetch'):
+                page = await get_article_page_by_url(
+                    app, article_url, revalidation, get_deadline(_timeout))
+        if revalidation:
+            revalidation_cache.count_revalidation(page.text is None)
+        if page.text is None:
+            text_hash, analysis = revalidation.text_hash, revalidation.analysis
+        else:
+            text_hash, analysis = await analyze_article_html(
+                app, adapter, page.text, deadline)
+        revalidation_cache.set_revalidation(article_url, page, text_hash,
+                                            analysis)
+        jaundice_rate, word_count = analysis
+    except ClientError:
         status = ProcessingStatus.FETCH_ERROR
     except ArticleNotFoundError:
         status = ProcessingStatus.PARSING_ERROR
-    except (TimeoutError, asyncio.TimeoutError):
+    except ArticleTooLargeError:
+        status = ProcessingStatus.TOO_LARGE
+    except TransientFetchError:
+        status = ProcessingStatus.TRANSIENT_ERROR
+    except PhaseTimeoutError as error:
         status = ProcessingStatus.TIMEOUT
-    return article_url, status, jaundice_rate, word_count
+        timeout_phase = error.phase
+    return article_url, status, jaundice_rate, word_count, timeout_phase
+
+
+async def process_article_safely(app, article_url, deadline):
+    try:
+        return await process_article(app, article_url, deadline)
+    except Exception:
+        logging.exception(f' Unexpected error on {article_url}')
+        return article_url, ProcessingStatus.PARSING_ERROR, None, None, None
+
+
+async def process_article_within_limits(app, article_url, deadline):
+    try:
+        async with app['limiter'].acquire(article_url,
+                                          get_remaining_time(deadline)):
+            result = await process_article_safely(app, article_url, deadline)
+    except asyncio.TimeoutError:
+        result = article_url, ProcessingStatus.TIMEOUT, None, None, 'queue'
+    app['metrics'].articles.inc(status=result[1].value)
+    if random.random() < app['result_log_rate']:
+        logging.info(f' {serialize_result(result)=}')
+    return result
+
+
+async def process_article_once(app, article_url, deadline):
+    """Concurrent requests for the same article share one processing.
+
+    The shared processing does not depend on the caller that started it:
+    it is bounded by the phase timeouts and the longest request budget.
+    Each caller waits for it until its own deadline only."""
+    timeouts = app['timeouts']
+    shared_deadline = get_deadline(max(timeouts.request,
+                                       timeouts.bulk_request))
+    try:
+        return await asyncio.wait_for(app['single_flight'].run(
+            article_url, partial(process_article_within_limits, app,
+                                 article_url, shared_deadline)),
+            get_remaining_time(deadline))
+    except asyncio.TimeoutError:
+        return article_url, ProcessingStatus.TIMEOUT, None, None, 'request'
+
 
+async def process_articles(app, article_urls, deadline):
+    async with create_handy_nursery() as nursery:
+        parallel_tasks = [nursery.start_soon(process_article_once(
+            app, article_url, deadline)) for article_url in article_urls]
+    return list(serialize_results(parallel_tasks))
+
+
+async def stream_results(request, memo_results, urls_to_process, use_cache,
+                         deadline):
+    """Writes NDJSON lines: cache hits first, then each article as it's done."""
+    response = web.StreamResponse(
+        headers={'Content-Type': 'application/x-ndjson; charset=utf-8'})
+    await response.prepare(request)
+    for memo_result in memo_results:
+        await response.write(f'{json.dumps(memo_result)}\n'.encode())
 
-async def process_articles(article_urls, charged_words, morph):
-    parallel_tasks = list()
+    handler_results = list()
     async with create_handy_nursery() as nursery:
-        for article_url in article_urls:
-            parallel_tasks.append(nursery.start_soon(process_article(
-                article_url, charged_words, morph)))
-            raw_data_sets, _ = await asyncio.wait(parallel_tasks)
-    return list(serialize_results(raw_data_sets))
+        parallel_tasks = [nursery.start_soon(process_article_once(
+            request.app, article_url, deadline))
+            for article_url in urls_to_process]
+        for next_done in asyncio.as_completed(parallel_tasks):
+            result = serialize_result(await next_done)
+            handler_results.append(result)
+            await response.write(f'{json.dumps(result)}\n'.encode())
+
+    if use_cache:
+        await request.app['cache'].write_many(handler_results)
+    await response.write_eof()
+    return response
+
+
+async def refresh_articles(app, article_urls):
+    """A stale OK result is replaced only by a new OK or PARSING_ERROR one,
+    a transient failure of the refresh keeps it served."""
+    deadline = get_deadline(app['timeouts'].request)
+    handler_results = await process_articles(app, article_urls, deadline)
+    await app['cache'].write_many([
+        result for result in handler_results
+        if result['status'] in REFRESH_STATUSES])
+
+
+def schedule_refresh(app, article_urls):
+    """Reprocesses stale cached articles in background."""
+    urls_to_refresh = [_url for _url in article_urls
+                       if _url not in app['single_flight']]
+    if not urls_to_refresh:
+        return
+    task = asyncio.ensure_future(refresh_articles(app, urls_to_refresh))
+    app['background_tasks'].add(task)
+    task.add_done_callback(app['background_tasks'].discard)
+
+
+async def read_cached_results(app, article_urls, use_cache):
+    if not use_cache:
+        return dict()
+    entries = await app['cache'].read_many(article_urls)
+    schedule_refresh(app, [_url for _url, entry in zip(article_urls, entries)
+                           if entry and not entry.is_fresh()])
+    return {_url: entry.data for _url, entry in zip(article_urls, entries)
+            if entry}
+
+
+async def get_results(app, article_urls, use_cache, deadline):
+    results_by_url = await read_cached_results(app, article_urls, use_cache)
+    urls_to_process = [_url for _url in article_urls
+                       if _url not in results_by_url]
+    if urls_to_process:
+        handler_results = await process_articles(app, urls_to_process,
+                                                 deadline)
+        if use_cache:
+            await app['cache'].write_many(handler_results)
+        results_by_url.update((res['url'], res) for res in handler_results)
+    return [results_by_url[_url] for _url in article_urls]
 
 
-async def handle_request(charged_words, morph, redis_host, redis_port,
-                         use_cache, request):
-    memo_results = list()
+async def handle_request(use_cache, request):
     try:
         article_urls = request.query['urls'].split(',')
         if len(article_urls) > 10:
             raise UrlLimitError
-        if use_cache:
-            memo_results = [await read_from_cache(
-                _url, redis_host, redis_port) for _url in article_urls]
-
-        memo_article_urls = [res['url'] for res in memo_results if res]
-        urls_to_process = list(set(article_urls) ^ set(memo_article_urls))
-
-        if urls_to_process:
-            async with create_handy_nursery() as nursery:
-                handler_results = await nursery.start_soon(
-                    process_articles(urls_to_process, charged_words, morph))
-                if all([handler_results, use_cache]):
-                    for process_res in handler_results:
-                        await nursery.start_soon(write_to_cache(process_res,
-                                                                redis_host,
-                                                                redis_port))
-                memo_results.extend(handler_results)
-        return web.json_response([res for res in memo_results if res])
-
     except KeyError:
         return web.json_response(data={'ERROR': 'no urls'}, status=400)
 
@@ -102,18 +293,268 @@ async def handle_request(charged_words, morph, redis_host, redis_port,
             data={'ERROR': 'too many urls in request, should be 10 or less'},
             status=400)
 
+    deadline = get_deadline(request.app['timeouts'].request)
+    unique_urls = list(dict.fromkeys(map(normalize_url, article_urls)))
+    if request.query.get('stream', '').lower() in STREAM_QUERY_VALUES:
+        results_by_url = await read_cached_results(request.app, unique_urls,
+                                                   use_cache)
+        urls_to_process = [_url for _url in unique_urls
+                           if _url not in results_by_url]
+        return await stream_results(request, list(results_by_url.values()),
+                                    urls_to_process, use_cache, deadline)
+
+    return web.json_response(
+        await get_results(request.app, unique_urls, use_cache, deadline))
+
+
+async def read_bulk_urls(request):
+    """Accepts a JSON list, {"urls": [...]} or NDJSON with one url per line,
+    urls may be given as strings or {"url": ...} objects."""
+    body = await request.text()
+    if request.content_type == 'application/x-ndjson':
+        items = [json.loads(line) for line in body.splitlines() if line.strip()]
+    else:
+        items = json.loads(body)
+        if isinstance(items, dict):
+            items = items['urls']
+        if not isinstance(items, list):
+            raise TypeError
+    article_urls = [item['url'] if isinstance(item, dict) else item
+                    for item in items]
+    if not all(isinstance(_url, str) for _url in article_urls):
+        raise TypeError
+    return article_urls
+
+
+async def handle_bulk_request(use_cache, url_limit, request):
+    try:
+        article_urls = await read_bulk_urls(request)
+    except (ValueError, KeyError, TypeError):
+        return web.json_response(data={'ERROR': 'invalid request body'},
+                                 status=400)
+
+    unique_urls = list(dict.fromkeys(map(normalize_url, article_urls)))
+    if not unique_urls:
+        return web.json_response(data={'ERROR': 'no urls'}, status=400)
+    if len(unique_urls) > url_limit:
+        return web.json_response(
+            data={'ERROR': f'too many urls in request, '
+                           f'should be {url_limit} or less'},
+            status=400)
+
+    deadline = get_deadline(request.app['timeouts'].bulk_request)
+    return web.json_response(
+        await get_results(request.app, unique_urls, use_cache, deadline))
+
+
+async def handle_metrics(request):
+    return web.Response(text=request.app['metrics'].render(),
+                        headers={'Content-Type': METRICS_CONTENT_TYPE})
+
+
+@web.middleware
+async def track_requests(request, handler):
+    resource = request.match_info.route.resource
+    route = resource.canonical if resource else 'unmatched'
+    metrics = request.app['metrics']
+    with metrics.requests_in_progress.track_in_progress(route=route):
+        with metrics.request_seconds.time(route=route):
+            return await handler(request)
+
+
+def collect_cache_stats(app):
+    stats = Counter(app['revalidation_cache'].stats)
+    if 'cache' in app:
+        stats.update(app['cache'].stats)
+    info = lemma_cache_info()
+    stats['lemma', 'hit'], stats['lemma', 'miss'] = info.hits, info.misses
+    return stats
+
+
+def collect_fetch_stats(app):
+    if 'rate_limiter' not in app:
+        return dict()
+    return {(event,): count
+            for event, count in app['rate_limiter'].stats.items()}
+
+
+def collect_tasks(app):
+    return {('articles',): len(app['single_flight']),
+            ('background',): len(app['background_tasks']),
+            ('all',): len(asyncio.all_tasks())}
+
+
+def create_metrics(app):
+    metrics = ServiceMetrics()
+    metrics.counter('jaundice_cache_requests_total',
+                    'Cache lookups by tier and result', ['tier', 'result'],
+                    collect=partial(collect_cache_stats, app))
+    metrics.counter('jaundice_fetch_events_total',
+                    'Host rate limit waits, throttling responses and retries',
+                    ['event'], collect=partial(collect_fetch_stats, app))
+    metrics.gauge('jaundice_tasks_in_progress',
+                  'Articles in processing, background and all asyncio tasks',
+                  ['kind'], collect=partial(collect_tasks, app))
+    return metrics
+
+
+async def init_event_loop_monitor(args, app):
+    task = asyncio.ensure_future(
+        app['metrics'].monitor_event_loop_lag(args.loop_lag_interval))
+    app['background_tasks'].add(task)
+    task.add_done_callback(app['background_tasks'].discard)
+
+
+async def init_limiter(args, app):
+    app['limiter'] = ConcurrencyLimiter(args.max_concurrency,
+                                        args.max_per_host)
+    app['rate_limiter'] = HostRateLimiter(args.host_rate, args.host_burst)
+
+
+async def init_http_session(args, app):
+    app['http_session'] = create_http_session(
+        args.http_pool_size, args.http_per_host, args.dns_cache_ttl,
+        args.keepalive_timeout, compression=not args.no_http_compression)
+
+
+async def close_http_session(app):
+    await app['http_session'].close()
+
+
+async def init_cache(args, app):
+    app['cache'] = await ArticleCache.create(
+        args.redis_host, args.redis_port, args.redis_pool_size,
+        args.cache_ttl, negative_ttl=args.negative_cache_ttl,
+        stale_ttl=args.stale_cache_ttl, memory_size=args.memory_cache_size)
+
+
+async def close_background_tasks(app):
+    for task in list(app['background_tasks']):
+        task.cancel()
+
+
+async def close_cache(app):
+    await app['cache'].close()
+
+
+async def init_lemma_cache(args, app):
+    configure_lemma_cache(args.lemma_cache_size)
+    if args.lemma_warmup_file:
+        warm_up_lemma_cache(app['morph'], args.lemma_warmup_file)
+        logging.info(f' Lemma cache warmed up: {lemma_cache_info()}')
+
+
+async def report_lemma_cache(app):
+    logging.info(f' Lemma cache: {lemma_cache_info()}')
+
+
+async def init_executor(args, app):
+    app['executor'] = None
+    if args.morph_workers:
+        app['executor'] = ProcessPoolExecutor(
+            args.morph_workers, initializer=init_analysis_worker,
+            initargs=(app['charged_words'], args.lemma_cache_size,
+                      args.lemma_warmup_file))
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(app['executor'], analyze_text_in_worker, '')
+
+
+async def close_executor(app):
+    if app['executor'] is not None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, app['executor'].shutdown)
+
+
+def create_app(args, charged_words, morph):
+    app = web.Application(middlewares=[track_requests])
+    app['charged_words'] = charged_words
+    app['morph'] = morph
+    app['use_generic_adapter'] = args.use_generic_adapter
+    app['max_article_bytes'] = args.max_article_bytes
+    app['retry_policy'] = RetryPolicy(args.fetch_retries, args.retry_backoff,
+                                      MAX_RETRY_BACKOFF)
+    app['timeouts'] = PhaseTimeouts(args.fetch_timeout, args.parse_timeout,
+                                    args.analysis_timeout, args.request_timeout,
+                                    args.bulk_request_timeout)
+    app['single_flight'] = SingleFlight()
+    app['background_tasks'] = set()
+    app['revalidation_cache'] = RevalidationCache(args.revalidation_cache_size)
+    app['result_log_rate'] = args.result_log_rate
+    app['metrics'] = create_metrics(app)
+    app.on_startup.append(partial(init_limiter, args))
+    app.on_startup.append(partial(init_http_session, args))
+    app.on_startup.append(partial(init_lemma_cache, args))
+    app.on_startup.append(partial(init_executor, args))
+    app.on_startup.append(partial(init_event_loop_monitor, args))
+    app.on_cleanup.append(close_background_tasks)
+    app.on_cleanup.append(close_http_session)
+    app.on_cleanup.append(close_executor)
+    app.on_cleanup.append(report_lemma_cache)
+    if args.use_cache:
+        app.on_startup.append(partial(init_cache, args))
+        app.on_cleanup.append(close_cache)
+    app.add_routes([
+        web.get('/', partial(handle_request, args.use_cache)),
+        web.post('/bulk', partial(handle_bulk_request, args.use_cache,
+                                  args.bulk_url_limit)),
+        web.get('/metrics', handle_metrics),
+    ])
+    return app
+
+
+async def notify_ready(ready, app):
+    ready.set()
+
+
+async def report_startup(timings, started, app):
+    timings['app'] = time.perf_counter() - started
+    for phase, seconds in timings.items():
+        app['metrics'].startup_seconds.set(seconds, phase=phase)
+    logging.info(' Started in {:.2f} sec: {}'.format(
+        sum(timings.values()), ', '.join(
+            f'{phase} {seconds:.2f}' for phase, seconds in timings.items())))
+
+
+def load_dictionaries(args, timings):
+    with measure_time(timings, 'morph'):
+        morph = get_morph_analyzer()
+    with measure_time(timings, 'charged_dict'):
+        charged_words = ChargedDictionary.from_snapshot(
+            'charged_dict', args.charged_dict_snapshot, morph)
+    return charged_words, morph
+
+
+def run_server(args, ready=None, sock=None):
+    """Loads the dictionaries and serves until SIGINT or SIGTERM, then gives
+    in-flight requests args.shutdown_timeout to finish."""
+    timings = dict()
+    charged_words, morph = load_dictionaries(args, timings)
+    started = time.perf_counter()
+    app = create_app(args, charged_words, morph)
+    app.on_startup.append(partial(report_startup, timings, started))
+    if ready is not None:
+        app.on_startup.append(partial(notify_ready, ready))
+    if sock is not None:
+        web.run_app(app=app, sock=sock,
+                    shutdown_timeout=args.shutdown_timeout)
+    else:
+        web.run_app(app=app, host=args.host, port=args.port,
+                    reuse_port=args.reuse_port or None,
+                    shutdown_timeout=args.shutdown_timeout)
+
 
 def main():
     logging.basicConfig(level=logging.INFO)
     logging.getLogger('pymorphy2.opencorpora_dict.wrapper').setLevel(logging.ERROR)
-    charged_words = get_charged_words('charged_dict')
-    morph = pymorphy2.MorphAnalyzer()
     args = get_args_parser().parse_args()
-    handler = partial(handle_request, charged_words, morph,
-                      args.redis_host, args.redis_port, args.use_cache)
-    app = web.Application()
-    app.add_routes([web.get('/', handler)])
-    web.run_app(app=app, host=args.host, port=args.port)
+    if args.workers <= 1:
+        run_server(args)
+        return
+    sock = None
+    if not args.reuse_port:
+        sock = create_listening_socket(args.host, args.port)
+    WorkerPool(partial(run_server, args, sock=sock), args.workers,
+               args.shutdown_timeout).run()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,40 @@
+import unittest
+import pytest
+
+from adapters import get_adapter
+from adapters import generic
+from adapters import inosmi_ru
+from adapters.exceptions import ArticleNotFoundError
+from adapters.exceptions import UnsupportedDomainError
+
+PARAGRAPH = 'Аутсайдер совершил побег, и это стало началом громкого скандала. '
+
+BLOG_HTML = f"""<html><body><nav>Меню сайта</nav>
+<div class="sidebar"><p>Реклама</p></div>
+<div class="post"><p>{PARAGRAPH * 3}</p><p>{PARAGRAPH * 2}</p></div>
+<footer><p>Все права защищены</p></footer></body></html>"""
+
+
+@pytest.mark.adapters
+class TestAdapters(unittest.TestCase):
+
+    def test_get_adapter(self):
+        self.assertIs(get_adapter('https://inosmi.ru/politic/1.html'),
+                      inosmi_ru)
+        self.assertIs(get_adapter('https://www.inosmi.ru/politic/1.html'),
+                      inosmi_ru)
+        self.assertIs(get_adapter('https://plantarum.livejournal.com/1.html',
+                                  use_generic=True), generic)
+        with self.assertRaises(UnsupportedDomainError):
+            get_adapter('https://plantarum.livejournal.com/1.html')
+        with self.assertRaises(UnsupportedDomainError):
+            get_adapter('https://notinosmi.ru/1.html')
+
+    def test_generic_adapter(self):
+        text = generic.extract_article_plaintext(BLOG_HTML)
+        self.assertTrue(text.startswith('Аутсайдер совершил побег'))
+        self.assertNotIn('Реклама', text)
+        self.assertNotIn('Меню сайта', text)
+        self.assertNotIn('Все права защищены', text)
+        with self.assertRaises(ArticleNotFoundError):
+            generic.extract_article_plaintext('<html><p>Коротко</p></html>')
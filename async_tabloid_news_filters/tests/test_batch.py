@@ -0,0 +1,62 @@
+import json
+import os
+import tempfile
+import pytest
+import asynctest
+
+from batch import get_batch_args_parser
+from batch import run_batch
+from tools.helpers import get_args_parser
+
+ARTICLE_HTML = """<html><body><article class="article"><h1>Побег</h1>
+<p>Аутсайдер совершил побег, и это стало началом скандала.</p>
+</article></body></html>"""
+
+
+@pytest.mark.batch
+class TestBatch(asynctest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.input_folder = os.path.join(self.folder.name, 'articles')
+        os.mkdir(self.input_folder)
+        for name, html in (('a.html', ARTICLE_HTML),
+                           ('b.html', '<html><p>Нет статьи</p></html>')):
+            with open(os.path.join(self.input_folder, name), 'w',
+                      encoding='utf8') as f:
+                f.write(html)
+        self.output = os.path.join(self.folder.name, 'scores.jsonl')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    async def run_batch(self, *argv):
+        args = get_batch_args_parser().parse_args(
+            [self.input_folder, '-output', self.output, '-cpu_workers', '0',
+             *argv])
+        service_args = get_args_parser().parse_args(['-result_log_rate', '0'])
+        await run_batch(args, service_args)
+        with open(self.output, encoding='utf8') as f:
+            return [json.loads(line) for line in f]
+
+    async def test_process_folder(self):
+        results = {result['url']: result for result in await self.run_batch()}
+        article = results[os.path.join(self.input_folder, 'a.html')]
+        self.assertEqual(article['status'], 'OK')
+        self.assertTrue(article['words_count'] > 0)
+        self.assertEqual(
+            results[os.path.join(self.input_folder, 'b.html')]['status'],
+            'PARSING_ERROR')
+
+    async def test_resume(self):
+        with open(self.output, 'w', encoding='utf8') as f:
+            f.write(json.dumps({'status': 'OK', 'score': 1.0, 'words_count': 1,
+                                'url': os.path.join(self.input_folder,
+                                                    'a.html')}))
+            f.write('\n{"status": "OK", "url"')
+        results = await self.run_batch('-resume')
+        self.assertListEqual(
+            [result['url'] for result in results],
+            [os.path.join(self.input_folder, name)
+             for name in ('a.html', 'b.html')])
+        self.assertEqual(results[0]['score'], 1.0)
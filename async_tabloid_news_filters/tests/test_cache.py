@@ -0,0 +1,182 @@
+import asyncio
+import pickle
+import time
+import unittest
+from unittest import mock
+import pytest
+import asynctest
+
+from main import read_cached_results
+from main import refresh_articles
+from tools.cache import ArticleCache
+from tools.cache import CacheEntry
+from tools.cache import MemoryCache
+from tools.cache import dump_entry
+from tools.cache import load_entry
+from tools.helpers import PhaseTimeouts
+from tools.helpers import SingleFlight
+
+OK_RESULT = {'status': 'OK', 'url': 'https://inosmi.ru/a.html',
+             'score': 1.5, 'words_count': 100}
+
+
+def make_result(url, status='OK'):
+    return dict(OK_RESULT, url=url, status=status)
+
+
+class FakeRedis:
+    """Only the aioredis calls ArticleCache makes, values kept in a dict."""
+
+    def __init__(self):
+        self.values = dict()
+        self.expires = dict()
+        self.mget_calls = list()
+
+    async def mget(self, *keys):
+        self.mget_calls.append(keys)
+        return [self.values.get(key) for key in keys]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+
+    def __init__(self, redis):
+        self._redis = redis
+        self._commands = list()
+
+    def set(self, key, value, expire=0):
+        self._commands.append((key, value, expire))
+
+    async def execute(self):
+        for key, value, expire in self._commands:
+            self._redis.values[key] = value
+            self._redis.expires[key] = expire
+        return [True] * len(self._commands)
+
+
+@pytest.mark.cache
+class TestCache(unittest.TestCase):
+
+    def test_entry_serialization(self):
+        entry = CacheEntry(OK_RESULT, time.time() + 10, None)
+        self.assertEqual(load_entry(dump_entry(entry)), entry)
+        self.assertIsNone(load_entry(None))
+        self.assertIsNone(load_entry(pickle.dumps(OK_RESULT)))
+        self.assertIsNone(load_entry(b'{"v": 0, "data": {}}'))
+
+    def test_memory_cache(self):
+        now = time.time()
+        memory = MemoryCache(maxsize=2)
+        memory.set('a', CacheEntry('A', now + 10, now + 10))
+        memory.set('b', CacheEntry('B', now - 10, now + 10))
+        memory.set('c', CacheEntry('C', now - 10, now - 5))
+        self.assertIsNone(memory.get('a'))
+        self.assertFalse(memory.get('b').is_fresh())
+        self.assertIsNone(memory.get('c'))
+        self.assertEqual(len(memory), 1)
+
+    def test_make_entry(self):
+        cache = ArticleCache(None, ttl=100, negative_ttl=10, stale_ttl=50)
+        entry = cache.make_entry(OK_RESULT, now=1000)
+        self.assertEqual((entry.fresh_until, entry.stale_until), (1100, 1150))
+        entry = cache.make_entry(dict(OK_RESULT, status='FETCH_ERROR'),
+                                 now=1000)
+        self.assertEqual((entry.fresh_until, entry.stale_until), (1010, 1010))
+        self.assertIsNone(cache.make_entry(dict(OK_RESULT, status='TIMEOUT')))
+
+
+@pytest.mark.cache
+class TestArticleCache(asynctest.TestCase):
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.cache = ArticleCache(self.redis, ttl=100, negative_ttl=10,
+                                  stale_ttl=50)
+
+    async def test_read_many(self):
+        now = time.time()
+        await self.cache.write_many([make_result('a')])
+        self.redis.values.update({
+            'b': dump_entry(CacheEntry(make_result('b'), now + 10, now + 10)),
+            'c': b'{"v": 1, "data"',
+            'd': pickle.dumps(make_result('d')),
+            'e': dump_entry(CacheEntry(make_result('e'), now - 10, now - 5)),
+        })
+        entries = await self.cache.read_many(['a', 'b', 'c', 'd', 'e', 'f'])
+        self.assertListEqual([entry and entry.data['url'] for entry in entries],
+                             ['a', 'b', None, None, None, None])
+        self.assertListEqual(self.redis.mget_calls,
+                             [('b', 'c', 'd', 'e', 'f')])
+
+        entries = await self.cache.read_many(['a', 'b'])
+        self.assertListEqual([entry.data['url'] for entry in entries],
+                             ['a', 'b'])
+        self.assertEqual(len(self.redis.mget_calls), 1)
+        self.assertEqual(self.cache.stats['memory', 'hit'], 3)
+        self.assertEqual(self.cache.stats['redis', 'hit'], 1)
+        self.assertEqual(self.cache.stats['redis', 'miss'], 4)
+
+    async def test_write_many(self):
+        await self.cache.write_many([
+            make_result('a'), make_result('b', 'FETCH_ERROR'),
+            make_result('c', 'TIMEOUT')])
+        self.assertDictEqual(self.redis.expires, {'a': 150, 'b': 10})
+        self.assertEqual(load_entry(self.redis.values['a']).data,
+                         make_result('a'))
+
+        cache = ArticleCache(self.redis, ttl=0)
+        await cache.write_many([make_result('d')])
+        self.assertEqual(self.redis.expires['d'], 0)
+        self.assertIsNone(load_entry(self.redis.values['d']).stale_until)
+
+
+@pytest.mark.cache
+class TestStaleResults(asynctest.TestCase):
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.app = {
+            'cache': ArticleCache(self.redis, ttl=100, stale_ttl=50),
+            'single_flight': SingleFlight(),
+            'background_tasks': set(),
+            'timeouts': PhaseTimeouts(5, 2, 5, 10, 300),
+        }
+        now = time.time()
+        self.redis.values.update({
+            'a': dump_entry(CacheEntry(make_result('a'), now - 10, now + 10)),
+            'b': dump_entry(CacheEntry(make_result('b'), now + 10, now + 10)),
+        })
+
+    async def test_serve_stale_results(self):
+        with mock.patch('main.refresh_articles',
+                        asynctest.CoroutineMock()) as refresh:
+            results = await read_cached_results(self.app, ['a', 'b', 'c'],
+                                                use_cache=True)
+            await asyncio.gather(*self.app['background_tasks'])
+            refresh.assert_called_once_with(self.app, ['a'])
+
+            processed = asyncio.Event()
+            processing = asyncio.ensure_future(self.app['single_flight'].run(
+                'a', processed.wait))
+            await asyncio.sleep(0)
+            await read_cached_results(self.app, ['a', 'b'], use_cache=True)
+            processed.set()
+            await processing
+        self.assertEqual(refresh.call_count, 1)
+        self.assertListEqual(list(results), ['a', 'b'])
+        self.assertEqual(results['a'], make_result('a'))
+
+    async def test_refresh_keeps_stale_result(self):
+        with mock.patch('main.process_articles', asynctest.CoroutineMock(
+                return_value=[make_result('a', 'FETCH_ERROR')])):
+            await refresh_articles(self.app, ['a'])
+        entry, = await self.app['cache'].read_many(['a'])
+        self.assertEqual(entry.data['status'], 'OK')
+
+        with mock.patch('main.process_articles', asynctest.CoroutineMock(
+                return_value=[make_result('a', 'PARSING_ERROR')])):
+            await refresh_articles(self.app, ['a'])
+        entry, = await self.app['cache'].read_many(['a'])
+        self.assertEqual(entry.data['status'], 'PARSING_ERROR')
@@ -0,0 +1,291 @@
+import asyncio
+import unittest
+from unittest import mock
+import pytest
+import asynctest
+from aiohttp import ClientSession, web
+from aiohttp.test_utils import TestServer
+
+from adapters.exceptions import ArticleNotFoundError
+
+from tools.helpers import ArticleTooLargeError
+from tools.helpers import HostRateLimiter
+from tools.helpers import RetryPolicy
+from tools.helpers import TransientFetchError
+from tools.helpers import ConcurrencyLimiter
+from tools.helpers import PhaseTimeoutError
+from tools.helpers import SingleFlight
+from tools.helpers import fetch_page
+from tools.helpers import fetch_page_with_retries
+from tools.helpers import get_deadline
+from tools.helpers import normalize_url
+from tools.helpers import parse_retry_after
+from tools.helpers import phase_deadline
+
+CP1251_TEXT = ('Во-первых, он хочет, чтобы побег стал началом громкого '
+               'скандала. Аутсайдер совершил побег из тюрьмы.')
+
+
+@pytest.mark.helpers
+class TestConcurrencyLimiter(asynctest.TestCase):
+
+    async def run_limited(self, limiter, urls):
+        running = {'now': 0, 'max': 0}
+
+        async def worker(url):
+            async with limiter.acquire(url):
+                running['now'] += 1
+                running['max'] = max(running['max'], running['now'])
+                await asyncio.sleep(0.01)
+                running['now'] -= 1
+
+        await asyncio.gather(*[worker(url) for url in urls])
+        return running['max']
+
+    async def test_global_limit(self):
+        limiter = ConcurrencyLimiter(max_concurrency=3, max_per_host=10)
+        urls = [f'https://host{i}.ru/' for i in range(10)]
+        self.assertEqual(await self.run_limited(limiter, urls), 3)
+        self.assertEqual(len(limiter), 0)
+
+    async def test_per_host_limit(self):
+        limiter = ConcurrencyLimiter(max_concurrency=10, max_per_host=2)
+        urls = ['https://inosmi.ru/a.html'] * 6
+        self.assertEqual(await self.run_limited(limiter, urls), 2)
+
+    async def test_acquire_timeout(self):
+        limiter = ConcurrencyLimiter(max_concurrency=1, max_per_host=1)
+        async with limiter.acquire('https://inosmi.ru/a.html'):
+            with self.assertRaises(asyncio.TimeoutError):
+                async with limiter.acquire('https://inosmi.ru/b.html', 0.01):
+                    pass
+        async with limiter.acquire('https://inosmi.ru/b.html', 0.01):
+            self.assertEqual(len(limiter), 1)
+        self.assertEqual(len(limiter), 0)
+
+
+@pytest.mark.helpers
+class TestPhaseDeadline(asynctest.TestCase):
+
+    async def test_phase_timeout(self):
+        with self.assertRaises(PhaseTimeoutError) as context:
+            async with phase_deadline('fetch', 0.01):
+                await asyncio.sleep(1)
+        self.assertEqual(context.exception.phase, 'fetch')
+
+    async def test_request_deadline(self):
+        deadline = get_deadline(0.01)
+        async with phase_deadline('fetch', 5, deadline) as _timeout:
+            self.assertTrue(_timeout <= 0.01)
+        await asyncio.sleep(0.02)
+        with self.assertRaises(PhaseTimeoutError) as context:
+            async with phase_deadline('parse', 5, deadline):
+                pass
+        self.assertEqual(context.exception.phase, 'parse')
+
+
+@pytest.mark.helpers
+class TestSingleFlight(asynctest.TestCase):
+
+    async def test_shared_call(self):
+        single_flight = SingleFlight()
+        calls = list()
+
+        async def process(url):
+            calls.append(url)
+            await asyncio.sleep(0.01)
+            return url.upper()
+
+        results = await asyncio.gather(*[
+            single_flight.run(url, lambda url=url: process(url))
+            for url in ('a', 'b', 'a', 'a')])
+        self.assertListEqual(results, ['A', 'B', 'A', 'A'])
+        self.assertListEqual(sorted(calls), ['a', 'b'])
+        self.assertEqual(len(single_flight), 0)
+
+    async def test_cancel_abandoned_call(self):
+        single_flight = SingleFlight()
+        started = asyncio.Event()
+
+        async def process():
+            started.set()
+            await asyncio.sleep(1)
+
+        waiters = [asyncio.ensure_future(single_flight.run('a', process))
+                   for _ in range(2)]
+        await started.wait()
+        waiters[0].cancel()
+        await asyncio.sleep(0)
+        self.assertIn('a', single_flight)
+        waiters[1].cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0)
+        self.assertNotIn('a', single_flight)
+
+    async def test_join_after_abandoned_call(self):
+        single_flight = SingleFlight()
+        calls = list()
+
+        async def process():
+            calls.append('a')
+            try:
+                await asyncio.sleep(1)
+            finally:
+                await asyncio.sleep(0.05)
+            return 'A'
+
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(single_flight.run('a', process), 0.01)
+        self.assertNotIn('a', single_flight)
+        result = await asyncio.wait_for(
+            single_flight.run('a', lambda: asyncio.sleep(0, 'B')), 1)
+        self.assertEqual(result, 'B')
+        self.assertListEqual(calls, ['a'])
+
+
+@pytest.mark.helpers
+class TestFetchPage(asynctest.TestCase):
+
+    async def setUp(self):
+        async def page(request):
+            size = int(request.query.get('size', 10))
+            content_type = request.query.get('type', 'text/html')
+            return web.Response(body='ы'.encode() * size,
+                                content_type=content_type, charset='utf-8')
+
+        async def chunked_page(request):
+            response = web.StreamResponse(
+                headers={'Content-Type': 'text/html; charset=utf-8'})
+            await response.prepare(request)
+            for _ in range(100):
+                await response.write(b'a' * 1024)
+            return response
+
+        async def cp1251_page(request):
+            meta = request.query.get('meta', '')
+            body = f'<html><head>{meta}</head><body>{CP1251_TEXT}</body></html>'
+            return web.Response(body=body.encode('cp1251'), headers={
+                'Content-Type': request.query.get('type', 'text/html')})
+
+        self.throttled_requests = 0
+
+        async def throttled_page(request):
+            self.throttled_requests += 1
+            if self.throttled_requests <= int(request.query['times']):
+                return web.Response(status=429, headers={'Retry-After': '0'})
+            return await page(request)
+
+        app = web.Application()
+        app.router.add_get('/page', page)
+        app.router.add_get('/chunked', chunked_page)
+        app.router.add_get('/throttled', throttled_page)
+        app.router.add_get('/cp1251', cp1251_page)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.session = ClientSession()
+
+    async def tearDown(self):
+        await self.session.close()
+        await self.server.close()
+
+    async def test_fetch_page(self):
+        page = await fetch_page(self.session, self.server.make_url('/page'),
+                                max_bytes=100)
+        self.assertEqual(page.text, 'ы' * 10)
+
+    async def test_fetch_page_encoding(self):
+        for query in ({}, {'meta': '<meta charset="windows-1251">'},
+                      {'type': 'text/html; charset=cp1251'}):
+            page = await fetch_page(
+                self.session, self.server.make_url('/cp1251').with_query(query))
+            self.assertIn(CP1251_TEXT, page.text)
+        with self.assertRaises(ArticleNotFoundError):
+            await fetch_page(self.session, self.server.make_url(
+                '/cp1251').with_query(type='text/html; charset=unknown'))
+
+    async def test_fetch_too_large_page(self):
+        with self.assertRaises(ArticleTooLargeError):
+            await fetch_page(self.session,
+                             self.server.make_url('/page?size=100'),
+                             max_bytes=100)
+        with self.assertRaises(ArticleTooLargeError):
+            await fetch_page(self.session, self.server.make_url('/chunked'),
+                             max_bytes=10 * 1024)
+
+    async def test_fetch_throttled_page(self):
+        with self.assertRaises(TransientFetchError) as context:
+            await fetch_page(self.session,
+                             self.server.make_url('/throttled?times=1'))
+        self.assertEqual(context.exception.status, 429)
+        self.assertEqual(context.exception.retry_after, 0)
+
+    async def test_fetch_page_with_retries(self):
+        rate_limiter = HostRateLimiter(rate=100, burst=1)
+        retry_policy = RetryPolicy(retries=2, backoff=0.01, max_backoff=0.1)
+        deadline = get_deadline(5)
+        page = await fetch_page_with_retries(
+            self.session, str(self.server.make_url('/throttled?times=2')),
+            rate_limiter, retry_policy, deadline)
+        self.assertEqual(page.text, 'ы' * 10)
+        self.assertEqual(rate_limiter.stats['retry'], 2)
+        self.assertEqual(rate_limiter.stats['throttle'], 2)
+
+        self.throttled_requests = 0
+        with self.assertRaises(TransientFetchError):
+            await fetch_page_with_retries(
+                self.session, str(self.server.make_url('/throttled?times=5')),
+                rate_limiter, retry_policy, deadline)
+        self.assertEqual(self.throttled_requests, 3)
+
+    async def test_fetch_not_html_page(self):
+        with self.assertRaises(ArticleNotFoundError):
+            await fetch_page(self.session,
+                             self.server.make_url('/page?type=application/pdf'))
+
+
+@pytest.mark.helpers
+class TestHostRateLimiter(asynctest.TestCase):
+
+    async def test_rate_limit(self):
+        rate_limiter = HostRateLimiter(rate=100, burst=2)
+        started = self.loop.time()
+        for _ in range(6):
+            await rate_limiter.wait('https://inosmi.ru/a.html')
+        await rate_limiter.wait('https://other.ru/a.html')
+        self.assertTrue(0.03 < self.loop.time() - started < 0.5)
+        self.assertEqual(rate_limiter.stats['wait'], 4)
+
+    async def test_slow_down(self):
+        rate_limiter = HostRateLimiter(rate=100, burst=2)
+        rate_limiter.slow_down('https://inosmi.ru/a.html', retry_after=10)
+        with self.assertRaises(TransientFetchError):
+            await rate_limiter.wait('https://inosmi.ru/b.html', timeout=1)
+        await rate_limiter.wait('https://other.ru/a.html', timeout=1)
+
+    async def test_prune_idle_buckets(self):
+        with mock.patch('tools.helpers.MIN_BUCKETS_TO_PRUNE', 3):
+            rate_limiter = HostRateLimiter(rate=1000, burst=1)
+            rate_limiter.slow_down('https://inosmi.ru/a.html', retry_after=10)
+            for number in range(5):
+                await rate_limiter.wait(f'https://host{number}.ru/')
+                await asyncio.sleep(0.01)
+        self.assertEqual(len(rate_limiter), 2)
+        with self.assertRaises(TransientFetchError):
+            await rate_limiter.wait('https://inosmi.ru/b.html', timeout=1)
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after('120'), 120)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0)
+        self.assertIsNone(parse_retry_after('soon'))
+        self.assertIsNone(parse_retry_after(None))
+
+
+@pytest.mark.helpers
+class TestNormalizeUrl(unittest.TestCase):
+
+    def test_normalize_url(self):
+        self.assertEqual(normalize_url(' HTTPS://InoSMI.ru:443/a.html#top '),
+                         'https://inosmi.ru/a.html')
+        self.assertEqual(normalize_url('http://inosmi.ru:8080?x=1'),
+                         'http://inosmi.ru:8080/?x=1')
+        self.assertEqual(normalize_url('invalid_url'), 'invalid_url')
@@ -1,9 +1,22 @@
 import unittest
+from unittest import mock
 import pytest
 import requests
 
+from adapters import inosmi_ru
 from adapters.inosmi_ru import ArticleNotFoundError
+from adapters.inosmi_ru import extract_article_plaintext
 from adapters.inosmi_ru import sanitize_article_text
+from benchmarks.stub_server import load_corpus
+
+ARTICLE_HTML = """<html><body><header>Главное</header>
+<article class="article"><h1>Заголовок</h1>
+<div class="article-disclaimer">Мнение автора</div>
+<p>В субботу, 29 июня,<time>12:00</time> президент США Дональд Трамп</p>
+<script>var a = 1;</script><aside>Читайте также</aside>
+<p>За несколько часов до встречи с <a href="/si">Си</a></p>
+<footer class="article-footer">Подписывайтесь</footer></article>
+</body></html>"""
 
 
 @pytest.mark.adapters_inosmi_ru
@@ -36,3 +49,24 @@ class TestInosmiRu(unittest.TestCase):
         resp.raise_for_status()
         with self.assertRaises(ArticleNotFoundError):
             sanitize_article_text(resp.text)
+
+    def test_extract_article_plaintext(self):
+        parsers = [(inosmi_ru.HTMLParser, inosmi_ru.FAST_PARSER),
+                   (None, inosmi_ru.FAST_PARSER),
+                   (None, 'html.parser')]
+        for html_parser, soup_parser in parsers:
+            with mock.patch.object(inosmi_ru, 'HTMLParser', html_parser), \
+                    mock.patch.object(inosmi_ru, 'FAST_PARSER', soup_parser):
+                text = ' '.join(extract_article_plaintext(ARTICLE_HTML).split())
+                self.assertEqual(
+                    text, 'Заголовок В субботу, 29 июня, президент США '
+                          'Дональд Трамп За несколько часов до встречи с Си')
+                with self.assertRaises(ArticleNotFoundError):
+                    extract_article_plaintext('<html><p>Нет статьи</p></html>')
+
+    def test_benchmark_corpus(self):
+        for name, html in load_corpus().items():
+            text = ' '.join(extract_article_plaintext(html).split())
+            self.assertEqual(
+                text, ' '.join(sanitize_article_text(html, True).split()), name)
+            self.assertNotIn('Подписывайтесь', text, name)
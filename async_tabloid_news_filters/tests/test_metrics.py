@@ -0,0 +1,36 @@
+import unittest
+import pytest
+
+from tools.metrics import MetricsRegistry
+
+
+@pytest.mark.metrics
+class TestMetrics(unittest.TestCase):
+
+    def test_counter_and_gauge(self):
+        registry = MetricsRegistry()
+        counter = registry.counter('articles_total', 'Articles', ['status'])
+        gauge = registry.gauge('tasks', 'Tasks', collect=lambda: {(): 3})
+        counter.inc(status='OK')
+        counter.inc(2, status='OK')
+        self.assertEqual(counter.get(status='OK'), 3)
+        self.assertEqual(gauge.get(), 3)
+        self.assertIn('articles_total{status="OK"} 3', registry.render())
+        self.assertIn('tasks 3', registry.render())
+        with self.assertRaises(ValueError):
+            counter.inc(phase='fetch')
+
+    def test_histogram(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram('phase_seconds', 'Phases', ['phase'],
+                                       buckets=(0.1, 1))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, phase='fetch')
+        self.assertEqual(histogram.get(phase='fetch'), 3)
+        lines = registry.render().splitlines()
+        self.assertIn('# TYPE phase_seconds histogram', lines)
+        self.assertIn('phase_seconds_bucket{phase="fetch",le="0.1"} 1', lines)
+        self.assertIn('phase_seconds_bucket{phase="fetch",le="1"} 2', lines)
+        self.assertIn('phase_seconds_bucket{phase="fetch",le="+Inf"} 3', lines)
+        self.assertIn('phase_seconds_sum{phase="fetch"} 5.55', lines)
+        self.assertIn('phase_seconds_count{phase="fetch"} 3', lines)
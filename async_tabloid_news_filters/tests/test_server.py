@@ -1,14 +1,16 @@
+import asyncio
 import json
-from functools import partial
-import pymorphy2
+import time
+from unittest import mock
 import pytest
 from aiohttp import web
-from aiohttp.test_utils import AioHTTPTestCase, unittest_run_loop
+from aiohttp.test_utils import AioHTTPTestCase, TestServer, unittest_run_loop
 
 from tools.helpers import get_args_parser
-from tools.helpers import get_charged_words
 from tools.helpers import ProcessingStatus
-from main import handle_request
+from tools.text_tools import ChargedDictionary
+from tools.text_tools import get_morph_analyzer
+from main import create_app
 
 
 TEST_ARTICLES = [
@@ -25,25 +27,51 @@ TEST_ARTICLES = [
     'https://dvmn.org/filer/canonical/1561832205/162/'
 ]
 
+STUB_ARTICLE_HTML = """<html><body><article class="article"><h1>Побег</h1>
+<p>Аутсайдер совершил побег, и это стало началом скандала.</p>
+</article></body></html>"""
+
+
+def with_service_args(*argv):
+    """Service arguments of one test, the app is created with them."""
+    def decorate(test):
+        test.service_argv = argv
+        return test
+    return decorate
+
 
 @pytest.mark.server
 class TestApp(AioHTTPTestCase):
 
     def setUp(self):
-        args = get_args_parser().parse_args([])
-        self.charged_words = get_charged_words('./charged_dict')
-        self.morph = pymorphy2.MorphAnalyzer()
-        self.redis_host = args.redis_host
-        self.redis_port = args.redis_port
-        self.use_cache = args.use_cache
+        test = getattr(self, self._testMethodName)
+        args = get_args_parser().parse_args(getattr(test, 'service_argv', []))
+        self.args = args
+        self.charged_words = ChargedDictionary.from_folder('./charged_dict')
+        self.morph = get_morph_analyzer()
+        self.stub_servers = list()
         super().setUp()
 
     async def get_application(self):
-        handler = partial(handle_request, self.charged_words, self.morph,
-                          self.redis_host, self.redis_port, self.use_cache)
-        app = web.Application()
-        app.router.add_get('/', handler)
-        return app
+        return create_app(self.args, self.charged_words, self.morph)
+
+    async def tearDownAsync(self):
+        for stub_server in self.stub_servers:
+            await stub_server.close()
+
+    async def start_stub_server(self, article):
+        """Serves the article handler as an inosmi.ru page until the test
+        ends, returns the page url."""
+        stub = web.Application()
+        stub.router.add_get('/article.html', article)
+        stub_server = TestServer(stub)
+        self.stub_servers.append(stub_server)
+        await stub_server.start_server()
+        adapters_patch = mock.patch.dict('adapters.ADAPTERS',
+                                         {'127.0.0.1': 'inosmi_ru'})
+        adapters_patch.start()
+        self.addCleanup(adapters_patch.stop)
+        return str(stub_server.make_url('/article.html'))
 
     @unittest_run_loop
     async def test_process_few_urls_at_once(self):
@@ -131,4 +159,183 @@ class TestApp(AioHTTPTestCase):
         self.assertEqual(handler_results['status'], status.value)
         self.assertEqual(handler_results['url'], invalid_url)
         self.assertEqual(handler_results['score'], None)
-        self.assertEqual(handler_results['words_count'], None)
\ No newline at end of file
+        self.assertEqual(handler_results['words_count'], None)
+
+    @unittest_run_loop
+    async def test_process_urls_keep_order(self):
+        invalid_urls = ['invalid_url_b', 'invalid_url_a', 'invalid_url_c']
+        link = f"?urls={','.join(invalid_urls + invalid_urls[:1])}"
+        resp = await self.client.request("GET", link)
+        self.assertTrue(resp.status == 200)
+        resp_text = await resp.text()
+        handler_results = json.loads(resp_text)
+        self.assertListEqual([x['url'] for x in handler_results], invalid_urls)
+
+    @unittest_run_loop
+    async def test_process_urls_stream(self):
+        invalid_urls = ['invalid_url_b', 'invalid_url_a']
+        link = f"?stream=1&urls={','.join(invalid_urls)}"
+        resp = await self.client.request("GET", link)
+        self.assertTrue(resp.status == 200)
+        self.assertEqual(resp.content_type, 'application/x-ndjson')
+        resp_text = await resp.text()
+        handler_results = [json.loads(line) for line in resp_text.splitlines()]
+        self.assertSetEqual({x['url'] for x in handler_results},
+                            set(invalid_urls))
+        self.assertTrue(all(
+            [result['status'] == ProcessingStatus.FETCH_ERROR.value for result
+             in handler_results]))
+
+        resp = await self.client.request("GET", link.replace('stream=1',
+                                                             'stream=0'))
+        self.assertEqual(resp.content_type, 'application/json')
+        self.assertEqual(len(json.loads(await resp.text())), 2)
+
+    @unittest_run_loop
+    async def test_process_bulk_urls(self):
+        urls = ['invalid_url', 'https://Plantarum.livejournal.com/473023.html',
+                'invalid_url', 'https://plantarum.livejournal.com/473023.html#c']
+        for content_type, body in (
+                ('application/json', json.dumps({'urls': urls})),
+                ('application/x-ndjson', '\n'.join(map(json.dumps, urls)))):
+            resp = await self.client.request(
+                "POST", "/bulk", data=body,
+                headers={'Content-Type': content_type})
+            self.assertTrue(resp.status == 200)
+            handler_results = json.loads(await resp.text())
+            self.assertListEqual(
+                [(x['url'], x['status']) for x in handler_results],
+                [('invalid_url', ProcessingStatus.FETCH_ERROR.value),
+                 (TEST_ARTICLES[6], ProcessingStatus.PARSING_ERROR.value)])
+
+    @unittest_run_loop
+    async def test_process_bulk_invalid_body(self):
+        for body in ('{"urls": 1}', '"https://inosmi.ru/a.html"',
+                     '{"urls": "https://inosmi.ru/a.html"}'):
+            resp = await self.client.request("POST", "/bulk", data=body)
+            self.assertTrue(resp.status == 400)
+            handler_results = json.loads(await resp.text())
+            self.assertEqual(handler_results['ERROR'], 'invalid request body')
+
+    @unittest_run_loop
+    async def test_process_not_modified_article(self):
+        stub_requests = list()
+
+        async def article(request):
+            stub_requests.append(request.headers.get('If-None-Match'))
+            if request.headers.get('If-None-Match') == '"v1"':
+                return web.Response(status=304)
+            return web.Response(text=STUB_ARTICLE_HTML,
+                                content_type='text/html',
+                                headers={'ETag': '"v1"'})
+
+        link = await self.start_stub_server(article)
+        handler_results = list()
+        for _ in range(2):
+            resp = await self.client.request("GET", f"?urls={link}")
+            handler_results.append(json.loads(await resp.text())[0])
+
+        self.assertListEqual(stub_requests, [None, '"v1"'])
+        self.assertEqual(handler_results[0], handler_results[1])
+        self.assertEqual(handler_results[0]['status'],
+                         ProcessingStatus.OK.value)
+        self.assertTrue(handler_results[0]['words_count'] > 0)
+
+    @with_service_args('-fetch_timeout', '0.1')
+    @unittest_run_loop
+    async def test_process_slow_article(self):
+        async def article(request):
+            await asyncio.sleep(1)
+            return web.Response(text=STUB_ARTICLE_HTML,
+                                content_type='text/html')
+
+        link = await self.start_stub_server(article)
+        resp = await self.client.request("GET", f"?urls={link}")
+        handler_results = json.loads(await resp.text())[0]
+
+        self.assertEqual(handler_results['status'],
+                         ProcessingStatus.TIMEOUT.value)
+        self.assertEqual(handler_results['timeout_phase'], 'fetch')
+
+    @with_service_args('-parse_timeout', '0.05')
+    @unittest_run_loop
+    async def test_process_slow_parsing_article(self):
+        async def article(request):
+            return web.Response(text=STUB_ARTICLE_HTML,
+                                content_type='text/html')
+
+        def extract_slowly(html):
+            time.sleep(0.3)
+            return 'Аутсайдер совершил побег'
+
+        link = await self.start_stub_server(article)
+        with mock.patch('adapters.inosmi_ru.extract_article_plaintext',
+                        extract_slowly):
+            resp = await self.client.request("GET", f"?urls={link}")
+            handler_results = json.loads(await resp.text())[0]
+
+        self.assertEqual(handler_results['status'],
+                         ProcessingStatus.TIMEOUT.value)
+        self.assertEqual(handler_results['timeout_phase'], 'parse')
+
+    @unittest_run_loop
+    async def test_metrics(self):
+        resp = await self.client.request("GET", "?urls=invalid")
+        self.assertTrue(resp.status == 200)
+        resp = await self.client.request("GET", "/metrics")
+        self.assertTrue(resp.status == 200)
+        metrics = await resp.text()
+        self.assertIn('jaundice_articles_total{status="FETCH_ERROR"} 1',
+                      metrics)
+        self.assertIn('jaundice_request_seconds_count{route="/"} 1', metrics)
+        self.assertIn('jaundice_cache_requests_total{tier="lemma"', metrics)
+        self.assertIn('jaundice_tasks_in_progress{kind="all"}', metrics)
+
+    @with_service_args('-retry_backoff', '0.01')
+    @unittest_run_loop
+    async def test_process_throttled_article(self):
+        async def article(request):
+            return web.Response(status=503)
+
+        link = await self.start_stub_server(article)
+        resp = await self.client.request("GET", f"?urls={link}")
+        handler_results = json.loads(await resp.text())[0]
+
+        self.assertEqual(handler_results['status'],
+                         ProcessingStatus.TRANSIENT_ERROR.value)
+
+    @with_service_args('-request_timeout', '0.2')
+    @unittest_run_loop
+    async def test_shared_article_deadlines(self):
+        async def article(request):
+            await asyncio.sleep(0.5)
+            return web.Response(text=STUB_ARTICLE_HTML,
+                                content_type='text/html')
+
+        link = await self.start_stub_server(article)
+
+        async def get_result(method, number):
+            article_url = f'{link}?n={number}'
+            if method == 'GET':
+                resp = await self.client.request(
+                    method, '/', params={'urls': article_url})
+            else:
+                resp = await self.client.request(
+                    method, '/bulk', json=[article_url])
+            return json.loads(await resp.text())[0]
+
+        for number, methods in enumerate((('POST', 'GET'), ('GET', 'POST'))):
+            first = asyncio.ensure_future(get_result(methods[0], number))
+            await asyncio.sleep(0.05)
+            started = self.loop.time()
+            second = await get_result(methods[1], number)
+            elapsed = self.loop.time() - started
+            results = dict(zip(methods, (await first, second)))
+            if methods[1] == 'GET':
+                self.assertTrue(elapsed < 0.4)
+
+            self.assertEqual(results['POST']['status'],
+                             ProcessingStatus.OK.value)
+            self.assertEqual(results['GET']['status'],
+                             ProcessingStatus.TIMEOUT.value)
+            self.assertEqual(results['GET']['timeout_phase'], 'request')
@@ -1,19 +1,33 @@
+import os
+import tempfile
+import time
 import unittest
+from unittest import mock
+from concurrent.futures import ProcessPoolExecutor
 import pytest
 import aionursery
 import asynctest
-import pymorphy2
 
+from tools.text_tools import ChargedDictionary
+from tools.text_tools import analyze_text
+from tools.text_tools import analyze_text_by_phases
+from tools.text_tools import analyze_text_in_worker
 from tools.text_tools import calculate_jaundice_rate
+from tools.text_tools import configure_lemma_cache
+from tools.text_tools import get_morph_analyzer
+from tools.text_tools import get_normalized_words
+from tools.text_tools import init_analysis_worker
+from tools.text_tools import lemma_cache_info
 from tools.text_tools import has_latin_letters
 from tools.text_tools import split_by_words
+from tools.text_tools import tokenize
 
 
 @pytest.mark.text_tools
 class TestAsyncTextTools(asynctest.TestCase):
 
     async def test_split_by_words(self):
-        morph = pymorphy2.MorphAnalyzer()
+        morph = get_morph_analyzer()
         async with aionursery.Nursery() as nursery:
             case1 = await nursery.start_soon(
                 split_by_words(morph,
@@ -26,6 +40,16 @@ class TestAsyncTextTools(asynctest.TestCase):
         self.assertListEqual(case2,
                              ['удивительно', 'это', 'стать', 'начало'])
 
+    async def test_analyze_text_in_worker(self):
+        text = 'Аутсайдер хочет, чтобы побег стал началом!'
+        charged_words = ['аутсайдер', 'побег']
+        with ProcessPoolExecutor(1, initializer=init_analysis_worker,
+                                 initargs=(charged_words,)) as executor:
+            result = await self.loop.run_in_executor(
+                executor, analyze_text_in_worker, text)
+        self.assertTupleEqual(result, analyze_text(
+            get_morph_analyzer(), charged_words, text))
+
 
 @pytest.mark.text_tools
 class TestTextTools(unittest.TestCase):
@@ -34,7 +58,68 @@ class TestTextTools(unittest.TestCase):
         case = tuple(map(has_latin_letters, ('string', 'stringЮ', 'Проверка1')))
         self.assertTupleEqual(case, (True, True, False))
 
+    def test_tokenize(self):
+        case = list(tokenize('«Во-первых», он_ хочет: 2019 года… iPhone 10%!'))
+        self.assertListEqual(case, ['Во-первых', 'он', 'хочет', 'года'])
+
+    def test_analyze_text_deadline(self):
+        with self.assertRaises(TimeoutError):
+            analyze_text(get_morph_analyzer(), [], 'слово ' * 1000,
+                         deadline=time.time() - 1)
+
+    def test_analyze_text_by_phases(self):
+        morph = get_morph_analyzer()
+        text = 'Аутсайдер хочет, чтобы побег стал началом!'
+        charged_words = ['аутсайдер', 'побег']
+        analysis, timings = analyze_text_by_phases(morph, charged_words, text)
+        self.assertTupleEqual(analysis,
+                              analyze_text(morph, charged_words, text))
+        self.assertListEqual(list(timings), ['tokenize', 'lemmatize', 'score'])
+
+    def test_lemma_cache(self):
+        morph = get_morph_analyzer()
+        configure_lemma_cache(maxsize=2)
+        get_normalized_words(morph, 'Хочет хочет стало началом хочет')
+        info = lemma_cache_info()
+        configure_lemma_cache()
+        self.assertEqual((info.hits, info.misses, info.currsize), (1, 4, 2))
+
     def test_calculate_jaundice_rate(self):
         self.assertTrue(-0.01 < calculate_jaundice_rate([], []) < 0.01)
         self.assertTrue(33.0 < calculate_jaundice_rate(
-            ['все', 'аутсайдер', 'побег'],['аутсайдер', 'банкротство']) < 34.0)
\ No newline at end of file
+            ['все', 'аутсайдер', 'побег'],['аутсайдер', 'банкротство']) < 34.0)
+
+    def test_charged_dictionary_score(self):
+        charged_dict = ChargedDictionary(['побег'], ['аутсайдер'])
+        score = charged_dict.score(iter(['все', 'аутсайдер', 'побег', 'побег']))
+        self.assertTupleEqual(score, (75.0, 50.0, 25.0, 4))
+        self.assertTupleEqual(charged_dict.score([]), (0.0, 0.0, 0.0, 0))
+
+    def test_charged_dictionary_snapshot(self):
+        morph = get_morph_analyzer()
+        with tempfile.TemporaryDirectory() as folder:
+            for tone, words in (('negative', 'Микробы\nпобег\n'),
+                                ('positive', 'цветы\n')):
+                with open(os.path.join(folder, f'{tone}_words.txt'), 'w',
+                          encoding='utf8') as f:
+                    f.write(words)
+            snapshot_path = os.path.join(folder, 'snapshot.json')
+            charged_dict = ChargedDictionary.from_snapshot(
+                folder, snapshot_path, morph)
+            self.assertSetEqual(set(charged_dict.negative_words),
+                                {'микробы', 'микроб', 'побег'})
+            self.assertTrue(os.path.exists(snapshot_path))
+
+            with mock.patch.object(ChargedDictionary, 'normalized') as rebuild:
+                cached_dict = ChargedDictionary.from_snapshot(
+                    folder, snapshot_path)
+            rebuild.assert_not_called()
+            self.assertSetEqual(cached_dict.words, charged_dict.words)
+
+            with open(os.path.join(folder, 'positive_words.txt'), 'w',
+                      encoding='utf8') as f:
+                f.write('счастье\n')
+            changed_dict = ChargedDictionary.from_snapshot(
+                folder, snapshot_path, morph)
+            self.assertIn('счастье', changed_dict.positive_words)
+            self.assertNotIn('цветы', changed_dict.positive_words)
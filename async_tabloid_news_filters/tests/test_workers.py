@@ -0,0 +1,87 @@
+import multiprocessing
+import os
+import signal
+import time
+import unittest
+import pytest
+
+from tools.workers import WorkerPool
+
+WAIT_TIMEOUT = 10
+
+
+def serve(started, failing, ready):
+    if failing.value:
+        os._exit(1)
+    started.put(os.getpid())
+    ready.set()
+    time.sleep(WAIT_TIMEOUT * 2)
+
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+@pytest.mark.workers
+class TestWorkerPool(unittest.TestCase):
+
+    def setUp(self):
+        context = multiprocessing.get_context('fork')
+        self.started = context.Queue()
+        self.failing = context.Value('b', 0)
+
+        def target(ready):
+            serve(self.started, self.failing, ready)
+
+        pool = WorkerPool(target, workers=2, shutdown_timeout=1,
+                          ready_timeout=WAIT_TIMEOUT)
+        self.master = context.Process(target=pool.run)
+        self.master.start()
+        self.addCleanup(self.stop_master)
+
+    def stop_master(self):
+        self.master.terminate()
+        self.master.join(WAIT_TIMEOUT)
+
+    def get_started(self, count):
+        return {self.started.get(timeout=WAIT_TIMEOUT) for _ in range(count)}
+
+    def wait_stopped(self, pids):
+        stop_until = time.monotonic() + WAIT_TIMEOUT
+        while any(map(is_running, pids)) and time.monotonic() < stop_until:
+            time.sleep(0.05)
+        return not any(map(is_running, pids))
+
+    def test_start_and_stop(self):
+        workers = self.get_started(2)
+        self.assertEqual(len(workers), 2)
+        self.stop_master()
+        self.assertEqual(self.master.exitcode, 0)
+        self.assertTrue(self.wait_stopped(workers))
+
+    def test_restart_dead_worker(self):
+        workers = self.get_started(2)
+        dead_worker = workers.pop()
+        os.kill(dead_worker, signal.SIGKILL)
+        new_worker, = self.get_started(1)
+        self.assertNotIn(new_worker, workers | {dead_worker})
+        self.assertTrue(is_running(workers.pop()))
+
+    def test_reload(self):
+        old_workers = self.get_started(2)
+        self.failing.value = 1
+        os.kill(self.master.pid, signal.SIGHUP)
+        time.sleep(0.5)
+        self.assertTrue(self.started.empty())
+        self.assertTrue(all(map(is_running, old_workers)))
+
+        self.failing.value = 0
+        os.kill(self.master.pid, signal.SIGHUP)
+        new_workers = self.get_started(2)
+        self.assertFalse(new_workers & old_workers)
+        self.assertTrue(self.wait_stopped(old_workers))
+        self.assertTrue(all(map(is_running, new_workers)))
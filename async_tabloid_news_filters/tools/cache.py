@@ -0,0 +1,207 @@
+import hashlib
+import json
+import logging
+import time
+from collections import Counter, OrderedDict, namedtuple
+import aioredis
+
+CACHE_FORMAT_VERSION = 1
+
+Revalidation = namedtuple('Revalidation', ['etag', 'last_modified',
+                                           'text_hash', 'analysis'])
+
+NEGATIVE_STATUSES = ('FETCH_ERROR', 'PARSING_ERROR', 'TOO_LARGE')
+
+
+class CacheEntry(namedtuple('CacheEntry', ['data', 'fresh_until',
+                                           'stale_until'])):
+    """Cached result; None in fresh_until or stale_until means forever."""
+
+    def is_fresh(self, now=None):
+        if self.fresh_until is None:
+            return True
+        return (now or time.time()) < self.fresh_until
+
+    def is_usable(self, now=None):
+        if self.stale_until is None:
+            return True
+        return (now or time.time()) < self.stale_until
+
+
+def dump_entry(entry):
+    return json.dumps({'v': CACHE_FORMAT_VERSION,
+                       'data': entry.data,
+                       'fresh_until': entry.fresh_until,
+                       'stale_until': entry.stale_until},
+                      ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def load_entry(value):
+    """Returns None for missing, corrupted or other-version values."""
+    if not value:
+        return None
+    try:
+        payload = json.loads(value)
+        if payload['v'] != CACHE_FORMAT_VERSION:
+            return None
+        return CacheEntry(payload['data'], payload['fresh_until'],
+                          payload['stale_until'])
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+class MemoryCache:
+    """In-process LRU of cache entries, expired entries are dropped on read."""
+
+    def __init__(self, maxsize):
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if not entry.is_usable():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key, entry):
+        if not self._maxsize:
+            return
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        if len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+
+
+class ArticleCache:
+    """Two-tier article results cache: in-process L1 in front of Redis L2.
+
+    OK results live for ttl and may be served stale for stale_ttl more
+    while they are refreshed; FETCH_ERROR, PARSING_ERROR and TOO_LARGE
+    results are kept for negative_ttl.
+
+    stats counts lookups by (tier, result), tier is memory or redis."""
+
+    def __init__(self, redis, ttl, negative_ttl=60, stale_ttl=0,
+                 memory_size=10000):
+        self._redis = redis
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._stale_ttl = stale_ttl
+        self._memory = MemoryCache(memory_size)
+        self.stats = Counter()
+
+    @classmethod
+    async def create(cls, host, port, pool_size, ttl, **kwargs):
+        redis = await aioredis.create_redis_pool((host, port),
+                                                 maxsize=pool_size)
+        return cls(redis, ttl, **kwargs)
+
+    async def close(self):
+        self._redis.close()
+        await self._redis.wait_closed()
+
+    async def read_many(self, urls):
+        """Returns usable cache entries for urls, None for misses.
+
+        Only L1 misses go to Redis, all of them in one MGET."""
+        entries = [self._memory.get(url) for url in urls]
+        missed_urls = [url for url, entry in zip(urls, entries) if not entry]
+        self.stats['memory', 'hit'] += len(urls) - len(missed_urls)
+        self.stats['memory', 'miss'] += len(missed_urls)
+        if not missed_urls:
+            return entries
+
+        try:
+            values = await self._redis.mget(*missed_urls)
+        except (aioredis.RedisError, OSError):
+            logging.exception(' READ REDIS CACHE FAILED')
+            return entries
+        redis_entries = dict()
+        for url, value in zip(missed_urls, values):
+            entry = load_entry(value)
+            if entry and entry.is_usable():
+                self._memory.set(url, entry)
+                redis_entries[url] = entry
+        self.stats['redis', 'hit'] += len(redis_entries)
+        self.stats['redis', 'miss'] += len(missed_urls) - len(redis_entries)
+        logging.info(f' READ REDIS CACHE DATA: {len(redis_entries)} hits')
+        return [entry or redis_entries.get(url)
+                for url, entry in zip(urls, entries)]
+
+    def make_entry(self, data, now=None):
+        """Returns None for results that should not be cached."""
+        now = now or time.time()
+        if data['status'] == 'OK':
+            if not self._ttl:
+                return CacheEntry(data, None, None)
+            fresh_until = now + self._ttl
+            return CacheEntry(data, fresh_until, fresh_until + self._stale_ttl)
+        if data['status'] in NEGATIVE_STATUSES and self._negative_ttl:
+            fresh_until = now + self._negative_ttl
+            return CacheEntry(data, fresh_until, fresh_until)
+        return None
+
+    async def write_many(self, results):
+        """Stores results in L1 and in Redis in one pipelined round trip."""
+        now = time.time()
+        pipe = self._redis.pipeline()
+        for data in results:
+            entry = self.make_entry(data, now)
+            if entry is None:
+                continue
+            self._memory.set(data['url'], entry)
+            expire = 0
+            if entry.stale_until is not None:
+                expire = max(1, round(entry.stale_until - now))
+            pipe.set(data['url'], dump_entry(entry), expire=expire)
+        try:
+            written = await pipe.execute()
+        except (aioredis.RedisError, OSError):
+            logging.exception(' WRITE REDIS CACHE FAILED')
+            return
+        if written:
+            logging.info(f' WRITE REDIS CACHE DATA: {len(written)} items')
+
+
+def get_text_hash(text):
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+class RevalidationCache:
+    """Keeps what is needed to skip re-analysis of unchanged articles:
+    HTTP validators with the last analysis per url, analyses per text hash.
+
+    stats counts lookups by (tier, result), tier is http or analysis."""
+
+    def __init__(self, maxsize):
+        self._revalidations = MemoryCache(maxsize)
+        self._analyses = MemoryCache(maxsize)
+        self.stats = Counter()
+
+    def get_revalidation(self, url):
+        entry = self._revalidations.get(url)
+        return entry.data if entry else None
+
+    def set_revalidation(self, url, page, text_hash, analysis):
+        if page.etag or page.last_modified:
+            revalidation = Revalidation(page.etag, page.last_modified,
+                                        text_hash, analysis)
+            self._revalidations.set(url, CacheEntry(revalidation, None, None))
+
+    def count_revalidation(self, not_modified):
+        self.stats['http', 'hit' if not_modified else 'miss'] += 1
+
+    def get_analysis(self, text_hash):
+        entry = self._analyses.get(text_hash)
+        self.stats['analysis', 'hit' if entry else 'miss'] += 1
+        return entry.data if entry else None
+
+    def set_analysis(self, text_hash, analysis):
+        self._analyses.set(text_hash, CacheEntry(analysis, None, None))
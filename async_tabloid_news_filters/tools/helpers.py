@@ -1,66 +1,239 @@
 import argparse
 import asyncio
 import contextlib
-import logging
-import os
-import pickle
+import random
+import re
 import time
+from collections import Counter, namedtuple
+from email.utils import parsedate_to_datetime
 from enum import Enum
+from functools import partial
+from http import HTTPStatus
+from urllib.parse import urlparse, urlsplit, urlunsplit
 import aionursery
-import aioredis
+import async_timeout
+import chardet
+from aiohttp import ClientSession, TCPConnector
+from aiohttp.client_exceptions import ClientConnectionError
+from aiohttp.client_exceptions import ClientPayloadError
 from aiohttp.client_exceptions import ClientResponseError
 
 
 from adapters.inosmi_ru import ArticleNotFoundError
 
 
+DEFAULT_PORTS = {
+    'http': 80,
+    'https': 443,
+}
+
+
+FetchedPage = namedtuple('FetchedPage', ['text', 'etag', 'last_modified'])
+
+
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+
+FETCH_CHUNK_SIZE = 64 * 1024
+
+META_CHARSET_BYTES = 1024
+
+META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w.:-]+)',
+                          re.IGNORECASE)
+
+TRANSIENT_HTTP_STATUSES = (
+    HTTPStatus.REQUEST_TIMEOUT,
+    HTTPStatus.TOO_MANY_REQUESTS,
+    HTTPStatus.INTERNAL_SERVER_ERROR,
+    HTTPStatus.BAD_GATEWAY,
+    HTTPStatus.SERVICE_UNAVAILABLE,
+    HTTPStatus.GATEWAY_TIMEOUT,
+)
+
+THROTTLING_HTTP_STATUSES = (
+    HTTPStatus.TOO_MANY_REQUESTS,
+    HTTPStatus.SERVICE_UNAVAILABLE,
+)
+
+MIN_BUCKETS_TO_PRUNE = 1000
+
+RetryPolicy = namedtuple('RetryPolicy', ['retries', 'backoff', 'max_backoff'])
+
+
 class UrlLimitError(Exception):
     pass
 
 
+class ArticleTooLargeError(Exception):
+    pass
+
+
+class TransientFetchError(Exception):
+    """The site is throttling or temporarily failing, worth retrying later."""
+
+    def __init__(self, status=None, retry_after=None):
+        super().__init__(status, retry_after)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class PhaseTimeoutError(asyncio.TimeoutError):
+
+    def __init__(self, phase):
+        super().__init__(phase)
+        self.phase = phase
+
+
+PhaseTimeouts = namedtuple('PhaseTimeouts', ['fetch', 'parse', 'analysis',
+                                             'request', 'bulk_request'])
+
+
 class ProcessingStatus(Enum):
     OK = 'OK'
     FETCH_ERROR = 'FETCH_ERROR'
     PARSING_ERROR = 'PARSING_ERROR'
     TIMEOUT = 'TIMEOUT'
+    TOO_LARGE = 'TOO_LARGE'
+    TRANSIENT_ERROR = 'TRANSIENT_ERROR'
 
 
-async def read_from_cache(url, host, port):
-    redis = await aioredis.create_redis((host, port))
+def normalize_url(url):
+    """Lowercases scheme and host, drops default port and fragment."""
+    url = url.strip()
+    parts = urlsplit(url)
     try:
-        val = await redis.get(url)
-        data = pickle.loads(val)
-        logging.info(' READ REDIS CACHE DATA')
-        return data
-    except (TypeError, aioredis.RedisError, asyncio.CancelledError):
-        return None
-    finally:
-        redis.close()
-        await redis.wait_closed()
+        port = parts.port
+    except ValueError:
+        return url
+    if not parts.scheme or not parts.hostname:
+        return url
+
+    netloc = parts.hostname
+    if ':' in netloc:
+        netloc = f'[{netloc}]'
+    if port and DEFAULT_PORTS.get(parts.scheme.lower()) != port:
+        netloc = f'{netloc}:{port}'
+    return urlunsplit((parts.scheme.lower(), netloc, parts.path or '/',
+                       parts.query, ''))
+
 
+def create_http_session(pool_size, per_host_limit, dns_cache_ttl,
+                        keepalive_timeout, compression=True):
+    connector = TCPConnector(limit=pool_size,
+                             limit_per_host=per_host_limit,
+                             use_dns_cache=True,
+                             ttl_dns_cache=dns_cache_ttl,
+                             keepalive_timeout=keepalive_timeout)
+    headers = {'Accept-Encoding': 'gzip, deflate' if compression else 'identity'}
+    return ClientSession(connector=connector, headers=headers)
 
-async def write_to_cache(data, host, port):
-    redis = await aioredis.create_redis((host, port))
+
+async def read_html(response, max_bytes=None):
+    """Reads an HTML body by chunks, gives up as soon as it is too large."""
+    if response.content_type not in HTML_CONTENT_TYPES:
+        raise ArticleNotFoundError
+    if max_bytes and (response.content_length or 0) > max_bytes:
+        raise ArticleTooLargeError
+
+    body = bytearray()
+    async for chunk in response.content.iter_chunked(FETCH_CHUNK_SIZE):
+        body.extend(chunk)
+        if max_bytes and len(body) > max_bytes:
+            raise ArticleTooLargeError
     try:
-        if data['status'] == 'OK':
-            await redis.set(data['url'], pickle.dumps(data))
-            logging.info(' WRITE REDIS CACHE DATA')
-    except (TypeError, aioredis.RedisError):
+        return body.decode(get_html_encoding(response, body), errors='replace')
+    except LookupError:
+        raise ArticleNotFoundError
+
+
+def get_html_encoding(response, body):
+    """Charset from Content-Type, from <meta> or guessed by chardet, like
+    response.text() does."""
+    if response.charset:
+        return response.charset
+    match = META_CHARSET.search(body[:META_CHARSET_BYTES])
+    if match:
+        return match.group(1).decode('ascii')
+    return chardet.detect(body)['encoding'] or 'utf-8'
+
+
+def parse_retry_after(value):
+    """Retry-After header in seconds or as an HTTP date to seconds."""
+    if not value:
         return None
-    finally:
-        redis.close()
-        await redis.wait_closed()
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
 
+async def fetch_page(session, url, etag=None, last_modified=None,
+                     max_bytes=None):
+    """Conditional GET: FetchedPage.text is None if the page is not modified.
 
-async def fetch(session, url):
+    Raises TransientFetchError on throttling and temporary server errors."""
+    headers = dict()
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
     try:
-        async with session.get(url) as response:
+        async with session.get(url, headers=headers) as response:
+            if response.status in TRANSIENT_HTTP_STATUSES:
+                raise TransientFetchError(response.status, parse_retry_after(
+                    response.headers.get('Retry-After')))
             response.raise_for_status()
-            return await response.text()
+            text = None
+            if response.status != HTTPStatus.NOT_MODIFIED:
+                text = await read_html(response, max_bytes)
+            return FetchedPage(text, response.headers.get('ETag'),
+                               response.headers.get('Last-Modified'))
     except ClientResponseError:
         raise ArticleNotFoundError
 
 
+def get_backoff_delay(attempt, backoff, max_backoff):
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(max_backoff, backoff * 2 ** attempt))
+
+
+async def fetch_page_with_retries(session, url, rate_limiter, retry_policy,
+                                  deadline, **kwargs):
+    """fetch_page that waits for the host rate limit and retries transient
+    errors with jittered exponential backoff while deadline (loop time)
+    allows. GET is idempotent, so a retry is always safe."""
+    for attempt in range(retry_policy.retries + 1):
+        await rate_limiter.wait(url, get_remaining_time(deadline))
+        try:
+            page = await fetch_page(session, url, **kwargs)
+        except TransientFetchError as error:
+            if error.status in THROTTLING_HTTP_STATUSES:
+                rate_limiter.slow_down(url, error.retry_after)
+            if attempt == retry_policy.retries:
+                raise
+            delay = error.retry_after or get_backoff_delay(
+                attempt, retry_policy.backoff, retry_policy.max_backoff)
+            if delay >= get_remaining_time(deadline):
+                raise
+        except (ClientConnectionError, ClientPayloadError):
+            if attempt == retry_policy.retries:
+                raise
+            delay = get_backoff_delay(attempt, retry_policy.backoff,
+                                      retry_policy.max_backoff)
+            if delay >= get_remaining_time(deadline):
+                raise
+        else:
+            rate_limiter.speed_up(url)
+            return page
+        rate_limiter.stats['retry'] += 1
+        await asyncio.sleep(delay)
+
+
 @contextlib.asynccontextmanager
 async def create_handy_nursery():
     try:
@@ -72,26 +245,223 @@ async def create_handy_nursery():
         raise
 
 
+class ConcurrencyLimiter:
+    """Bounds the number of articles processed at once, overall and per host."""
+
+    def __init__(self, max_concurrency, max_per_host):
+        self._total = asyncio.Semaphore(max_concurrency)
+        self._max_per_host = max_per_host
+        self._per_host = dict()
+        self._host_users = Counter()
+
+    def __len__(self):
+        """Number of hosts with articles in processing or waiting."""
+        return len(self._per_host)
+
+    def _get_host_semaphore(self, host):
+        host_semaphore = self._per_host.get(host)
+        if host_semaphore is None:
+            host_semaphore = asyncio.Semaphore(self._max_per_host)
+            self._per_host[host] = host_semaphore
+        self._host_users[host] += 1
+        return host_semaphore
+
+    def _release_host(self, host):
+        """Forgets the host semaphore once nobody holds or waits for it."""
+        self._host_users[host] -= 1
+        if not self._host_users[host]:
+            del self._host_users[host]
+            del self._per_host[host]
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, url, timeout=None):
+        """Raises asyncio.TimeoutError if no slot frees up within timeout."""
+        host = urlparse(url).hostname
+        host_semaphore = self._get_host_semaphore(host)
+        try:
+            async with async_timeout.timeout(timeout):
+                await host_semaphore.acquire()
+                try:
+                    await self._total.acquire()
+                except BaseException:
+                    host_semaphore.release()
+                    raise
+            try:
+                yield
+            finally:
+                self._total.release()
+                host_semaphore.release()
+        finally:
+            self._release_host(host)
+
+
+class TokenBucket:
+    """Token bucket with adaptive rate: throttling halves the rate and pauses
+    the bucket, every success brings back a tenth of the max rate (AIMD)."""
+
+    def __init__(self, rate, burst, min_rate):
+        self.max_rate = self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0
+
+    def _refill(self, now):
+        self._tokens = min(self.burst,
+                           self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, max_delay=None):
+        """Takes a token, returns how long to wait before using it or None
+        without taking one if that is longer than max_delay."""
+        now = time.monotonic()
+        self._refill(now)
+        delay = max(0.0, (1 - self._tokens) / self.rate,
+                    self._paused_until - now)
+        if max_delay is not None and delay > max_delay:
+            return None
+        self._tokens -= 1
+        return delay
+
+    def is_idle(self, now):
+        """Full and not paused: a new bucket would behave the same, apart
+        from a rate not yet recovered from throttling."""
+        self._refill(now)
+        return self._tokens >= self.burst and self._paused_until <= now
+
+    def slow_down(self, pause=None):
+        self.rate = max(self.min_rate, self.rate / 2)
+        pause = pause if pause is not None else 1 / self.rate
+        self._paused_until = max(self._paused_until, time.monotonic() + pause)
+
+    def speed_up(self):
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+
+class HostRateLimiter:
+    """Per-host token buckets for outgoing requests, rate 0 turns it off.
+
+    Idle buckets are dropped whenever the number of hosts doubles.
+    stats counts wait, throttle and retry events."""
+
+    def __init__(self, rate, burst, min_rate=0.1):
+        self._rate = rate
+        self._burst = burst
+        self._min_rate = min_rate
+        self._buckets = dict()
+        self._prune_at = MIN_BUCKETS_TO_PRUNE
+        self.stats = Counter()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def _prune(self):
+        now = time.monotonic()
+        for host, bucket in list(self._buckets.items()):
+            if bucket.is_idle(now):
+                del self._buckets[host]
+        self._prune_at = max(MIN_BUCKETS_TO_PRUNE, 2 * len(self._buckets))
+
+    def _get_bucket(self, url):
+        host = urlparse(url).hostname
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            if len(self._buckets) >= self._prune_at:
+                self._prune()
+            bucket = TokenBucket(self._rate, self._burst, self._min_rate)
+            self._buckets[host] = bucket
+        return bucket
+
+    async def wait(self, url, timeout=None):
+        """Raises TransientFetchError if the host is not available within
+        timeout."""
+        if not self._rate:
+            return
+        delay = self._get_bucket(url).reserve(timeout)
+        if delay is None:
+            raise TransientFetchError()
+        if delay:
+            self.stats['wait'] += 1
+            await asyncio.sleep(delay)
+
+    def slow_down(self, url, retry_after=None):
+        if self._rate:
+            self.stats['throttle'] += 1
+            self._get_bucket(url).slow_down(retry_after)
+
+    def speed_up(self, url):
+        if self._rate:
+            self._get_bucket(url).speed_up()
+
+
+class SingleFlight:
+    """Concurrent calls with the same key await one shared call, it is
+    cancelled and forgotten once no caller waits for it, so a later caller
+    starts a new call instead of joining one being cancelled."""
+
+    def __init__(self):
+        self._calls = dict()
+
+    def __len__(self):
+        return len(self._calls)
+
+    def __contains__(self, key):
+        return key in self._calls
+
+    async def run(self, key, coroutine_function):
+        call = self._calls.get(key)
+        if call is None:
+            call = asyncio.ensure_future(coroutine_function())
+            self._calls[key] = call
+            call.add_done_callback(partial(self._forget, key))
+            call.waiters = 0
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call)
+        finally:
+            call.waiters -= 1
+            if not call.waiters:
+                self._forget(key, call)
+                call.cancel()
+
+    def _forget(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+
+def get_deadline(timeout):
+    return asyncio.get_running_loop().time() + timeout
+
+
+def get_remaining_time(deadline):
+    return deadline - asyncio.get_running_loop().time()
+
+
+@contextlib.contextmanager
+def measure_time(timings, name):
+    """Adds the block duration to timings[name], sec."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = time.perf_counter() - started
+
+
 @contextlib.asynccontextmanager
-async def measure_execution_time(_timeout):
-    async with create_handy_nursery() as nursery:
-        start = time.monotonic()
-        yield nursery
-        end = time.monotonic() - start
-        if end > _timeout:
-            raise asyncio.TimeoutError
-        logging.info(' Analyzed in {:.2f} sec'.format(end))
-
-
-def get_charged_words(folder_name):
-    files = os.listdir('./' + folder_name)
-    words = list()
-    for file in files:
-        if file.endswith('txt'):
-            _filepath = f'{folder_name}/{file}'
-            with open(_filepath, encoding='utf8') as f:
-                words.extend([line.strip() for line in f.readlines()])
-    return words
+async def phase_deadline(phase, timeout, deadline=None):
+    """Cancels the block after timeout or at deadline (loop time), whichever
+    comes first, and reports the phase in PhaseTimeoutError."""
+    if deadline is not None:
+        remaining = get_remaining_time(deadline)
+        timeout = remaining if timeout is None else min(timeout, remaining)
+    if timeout is not None and timeout <= 0:
+        raise PhaseTimeoutError(phase)
+    try:
+        async with async_timeout.timeout(timeout):
+            yield timeout
+    except (asyncio.TimeoutError, TimeoutError):
+        raise PhaseTimeoutError(phase)
 
 
 def get_args_parser():
@@ -99,8 +469,86 @@ def get_args_parser():
     parser = argparse.ArgumentParser(formatter_class=formatter_class)
     parser.add_argument('-host', default='localhost')
     parser.add_argument('-port', type=int, default=80)
+    parser.add_argument('-workers', type=int, default=1,
+                        help='Server processes; SIGHUP to the master '
+                             'reloads them gracefully')
+    parser.add_argument('-reuse_port', action='store_true',
+                        help='Each worker binds its own SO_REUSEPORT socket '
+                             'instead of sharing the master one')
+    parser.add_argument('-shutdown_timeout', type=float, default=30,
+                        help='Time for in-flight requests to finish on stop '
+                             'or reload, sec')
     parser.add_argument('-redis_host', default='localhost')
     parser.add_argument('-redis_port', type=int, default=6379)
+    parser.add_argument('-bulk_url_limit', type=int, default=1000,
+                        help='Max urls in one POST /bulk request')
     parser.add_argument('-use_cache', action='store_true', default=False,
                         help='Redis cache ON/OFF checker')
+    parser.add_argument('-redis_pool_size', type=int, default=10,
+                        help='Max open Redis connections')
+    parser.add_argument('-cache_ttl', type=int, default=3600,
+                        help='Cached result lifetime, sec (0 - forever)')
+    parser.add_argument('-negative_cache_ttl', type=int, default=60,
+                        help='Cached fetch/parsing error lifetime, sec')
+    parser.add_argument('-stale_cache_ttl', type=int, default=600,
+                        help='How long an expired result may be served '
+                             'while it is refreshed, sec')
+    parser.add_argument('-fetch_timeout', type=float, default=5,
+                        help='Article download timeout, sec')
+    parser.add_argument('-parse_timeout', type=float, default=2,
+                        help='Article HTML parsing timeout, sec')
+    parser.add_argument('-analysis_timeout', type=float, default=5,
+                        help='Article text analysis timeout, sec')
+    parser.add_argument('-request_timeout', type=float, default=10,
+                        help='Time budget of a GET request, sec')
+    parser.add_argument('-bulk_request_timeout', type=float, default=300,
+                        help='Time budget of a POST /bulk request, sec')
+    parser.add_argument('-result_log_rate', type=float, default=1.0,
+                        help='Share of article results written to log, '
+                             '0 turns it off')
+    parser.add_argument('-loop_lag_interval', type=float, default=0.5,
+                        help='Event loop lag probe interval, sec')
+    parser.add_argument('-max_article_bytes', type=int, default=5000000,
+                        help='Max article page size, bytes')
+    parser.add_argument('-revalidation_cache_size', type=int, default=10000,
+                        help='Max articles remembered for conditional '
+                             're-fetch and text hash analysis cache')
+    parser.add_argument('-memory_cache_size', type=int, default=10000,
+                        help='Max results in in-process cache')
+    parser.add_argument('-charged_dict_snapshot',
+                        default='charged_dict/.snapshot.json',
+                        help='Normalized charged dictionary cache file, '
+                             'empty string turns it off')
+    parser.add_argument('-use_generic_adapter', action='store_true',
+                        default=False,
+                        help='Analyze sites without a dedicated adapter')
+    parser.add_argument('-morph_workers', type=int, default=0,
+                        help='Processes for text analysis (0 - in event loop)')
+    parser.add_argument('-lemma_cache_size', type=int, default=100000,
+                        help='Max word forms in lemma LRU cache')
+    parser.add_argument('-lemma_warmup_file', default=None,
+                        help='Frequency list to pre-warm lemma cache')
+    parser.add_argument('-max_concurrency', type=int, default=20,
+                        help='Max articles processed at once')
+    parser.add_argument('-max_per_host', type=int, default=5,
+                        help='Max articles processed at once from one host')
+    parser.add_argument('-host_rate', type=float, default=10,
+                        help='Max requests per second to one host, adapts to '
+                             '429 and Retry-After (0 - unlimited)')
+    parser.add_argument('-host_burst', type=int, default=10,
+                        help='Max burst of requests to one host')
+    parser.add_argument('-fetch_retries', type=int, default=2,
+                        help='Retries of throttled or failed downloads')
+    parser.add_argument('-retry_backoff', type=float, default=0.5,
+                        help='Base of exponential retry backoff, sec')
+    parser.add_argument('-http_pool_size', type=int, default=100,
+                        help='Max open HTTP connections')
+    parser.add_argument('-http_per_host', type=int, default=10,
+                        help='Max open HTTP connections to one host')
+    parser.add_argument('-dns_cache_ttl', type=int, default=300,
+                        help='DNS cache lifetime, sec')
+    parser.add_argument('-keepalive_timeout', type=float, default=30,
+                        help='Idle HTTP connection lifetime, sec')
+    parser.add_argument('-no_http_compression', action='store_true',
+                        default=False, help='Ask for uncompressed responses')
     return parser
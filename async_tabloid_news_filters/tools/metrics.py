@@ -0,0 +1,203 @@
+import asyncio
+import contextlib
+import math
+import time
+from collections import defaultdict
+
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5,
+                   5, 10)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join('{}="{}"'.format(
+        name, str(value).replace('\\', r'\\').replace('"', r'\"')
+                        .replace('\n', r'\n'))
+        for name, value in labels)
+    return '{' + pairs + '}'
+
+
+class Metric:
+    """Metric in Prometheus text format.
+
+    With collect, values are taken from collect() on every scrape: it returns
+    {label values tuple: value}, so state kept elsewhere is not duplicated."""
+
+    type_name = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._collect = collect
+        self._values = defaultdict(float)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def get(self, **labels):
+        return self._samples().get(self._key(labels), 0)
+
+    def _samples(self):
+        if self._collect is not None:
+            return {tuple(map(str, key)): value
+                    for key, value in self._collect().items()}
+        return self._values
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} {self.type_name}'
+        for key, value in sorted(self._samples().items()):
+            labels = _format_labels(list(zip(self.labelnames, key)))
+            yield f'{self.name}{labels} {_format_value(value)}'
+
+
+class Counter(Metric):
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self._values[self._key(labels)] += amount
+
+
+class Gauge(Metric):
+    type_name = 'gauge'
+
+    def set(self, value, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        self._values[self._key(labels)] += amount
+
+    def dec(self, amount=1, **labels):
+        self._values[self._key(labels)] -= amount
+
+    @contextlib.contextmanager
+    def track_in_progress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._counts = defaultdict(lambda: [0] * len(self.buckets))
+        self._sums = defaultdict(float)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        counts = self._counts[key]
+        for number, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[number] += 1
+                break
+        self._sums[key] += value
+
+    def get(self, **labels):
+        """Returns the number of observations."""
+        return sum(self._counts.get(self._key(labels), ()))
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} {self.type_name}'
+        for key, counts in sorted(self._counts.items()):
+            label_pairs = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(
+                    label_pairs + [('le', _format_value(bound))])
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(label_pairs)
+            yield f'{self.name}_sum{labels} {_format_value(self._sums[key])}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._metrics = list()
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=(), collect=None):
+        return self.register(Counter(name, documentation, labelnames, collect))
+
+    def gauge(self, name, documentation, labelnames=(), collect=None):
+        return self.register(Gauge(name, documentation, labelnames, collect))
+
+    def histogram(self, name, documentation, labelnames=(),
+                  buckets=DEFAULT_BUCKETS):
+        return self.register(
+            Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = [line for metric in self._metrics for line in metric.render()]
+        return '\n'.join(lines) + '\n'
+
+
+class ServiceMetrics(MetricsRegistry):
+    """Metrics of the jaundice rate service."""
+
+    def __init__(self):
+        super().__init__()
+        self.phase_seconds = self.histogram(
+            'jaundice_phase_seconds',
+            'Article processing phase latency', ['phase'])
+        self.request_seconds = self.histogram(
+            'jaundice_request_seconds',
+            'HTTP request latency', ['route'])
+        self.requests_in_progress = self.gauge(
+            'jaundice_requests_in_progress',
+            'HTTP requests being handled', ['route'])
+        self.startup_seconds = self.gauge(
+            'jaundice_startup_seconds',
+            'Duration of server startup phases', ['phase'])
+        self.articles = self.counter(
+            'jaundice_articles_total',
+            'Processed articles by status', ['status'])
+        self.event_loop_lag = self.histogram(
+            'jaundice_event_loop_lag_seconds',
+            'Event loop lag')
+        self.last_event_loop_lag = self.gauge(
+            'jaundice_event_loop_last_lag_seconds',
+            'Last measured event loop lag')
+
+    async def monitor_event_loop_lag(self, interval):
+        """Sleeps for interval and records how much later it wakes up."""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(interval)
+            lag = max(0.0, loop.time() - started - interval)
+            self.event_loop_lag.observe(lag)
+            self.last_event_loop_lag.set(lag)
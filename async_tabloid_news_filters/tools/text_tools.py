@@ -1,43 +1,305 @@
 import asyncio
+import functools
+import hashlib
+import json
+import logging
+import os
 import re
 import string
+import time
+from collections import namedtuple
+import pymorphy2
+
+DEADLINE_CHECK_EVERY = 256
+LEMMA_CACHE_SIZE = 100_000
+CHARGED_DICT_SNAPSHOT_VERSION = 1
+CHARGED_DICT_TONES = ('negative', 'positive')
+
+_worker_state = dict()
+
+JaundiceScore = namedtuple('JaundiceScore', ['rate', 'negative_rate',
+                                             'positive_rate', 'words_count'])
+
+
+@functools.lru_cache(maxsize=None)
+def get_morph_analyzer():
+    """Один MorphAnalyzer на процесс: загрузка словарей pymorphy2 дорогая."""
+    return pymorphy2.MorphAnalyzer()
+
+
+def _parse_normal_form(morph, word):
+    return morph.parse(word)[0].normal_form
+
+
+get_normal_form = functools.lru_cache(maxsize=LEMMA_CACHE_SIZE)(
+    _parse_normal_form)
+
+
+def configure_lemma_cache(maxsize=LEMMA_CACHE_SIZE):
+    """Пересоздает общий LRU-кэш нормальных форм, счетчики обнуляются."""
+    global get_normal_form
+    get_normal_form = functools.lru_cache(maxsize=maxsize)(_parse_normal_form)
+
+
+def warm_up_lemma_cache(morph, filepath):
+    """Заполняет кэш словами из частотного списка: одно слово в начале строки,
+    самые частые - первыми."""
+    maxsize = get_normal_form.cache_info().maxsize
+    with open(filepath, encoding='utf8') as f:
+        for number, line in enumerate(f):
+            if maxsize is not None and number >= maxsize:
+                break
+            if fields := line.split():
+                get_normal_form(morph, fields[0].lower())
+
+
+def lemma_cache_info():
+    return get_normal_form.cache_info()
+
+
+_LATIN_LETTERS = re.compile(r'[a-zA-Z]')
+_REMOVED_SYMBOLS = str.maketrans('', '', '«»…"_:.,')
 
 
 def has_latin_letters(string):
-    characherregex = re.compile(r'[a-zA-Z]')
-    return any(characherregex.search(symbol) for symbol in string)
+    return _LATIN_LETTERS.search(string) is not None
 
 
 def _clean_word(word):
-    word = word.replace('«', '').replace('»', '').replace('…', '')
-    word = word.replace('"', '').replace('"', '').replace('_', '')
-    word = word.replace(':', '').replace('.', '').replace(',', '')
-    word = word.strip(string.punctuation)
+    word = word.translate(_REMOVED_SYMBOLS).strip(string.punctuation)
     if not word.isdigit():
         return word
 
 
+def tokenize(text):
+    """Отдает очищенные от пунктуации слова без цифр и латиницы."""
+    for word in text.split():
+        cleaned_word = _clean_word(word)
+        if cleaned_word and not has_latin_letters(cleaned_word):
+            yield cleaned_word
+
+
+def iter_normalized_words(morph, text, deadline=None):
+    """Учитывает знаки пунктуации, регистр и словоформы, выкидывает предлоги.
+
+    Бросает TimeoutError, если работа не уложилась в deadline (time.time())."""
+    return normalize_words(morph, tokenize(text), deadline)
+
+
+def normalize_words(morph, words, deadline=None):
+    """Приводит уже очищенные слова к нормальной форме, выкидывает предлоги.
+
+    Слова приводятся к нижнему регистру до кэша: pymorphy2 все равно это
+    делает, а «Хочет» и «хочет» попадают в одну запись."""
+    for number, word in enumerate(words):
+        if deadline and number % DEADLINE_CHECK_EVERY == 0:
+            if time.time() > deadline:
+                raise TimeoutError
+        normalized_word = get_normal_form(morph, word.lower())
+        if len(normalized_word) > 2 or normalized_word == 'не':
+            yield normalized_word
+
+
+def get_normalized_words(morph, text, deadline=None):
+    return list(iter_normalized_words(morph, text, deadline))
+
+
 async def split_by_words(morph, text):
     """Учитывает знаки пунктуации, регистр и словоформы, выкидывает предлоги."""
-    words = []
-    for word in text.split():
-        if cleaned_word := _clean_word(word):
-            normalized_word = morph.parse(cleaned_word)[0].normal_form
-            if len(normalized_word) > 2 or normalized_word == 'не':
-                words.append(normalized_word)
-    splitted = [word for word in words if not has_latin_letters(word)]
+    words = get_normalized_words(morph, text)
     await asyncio.sleep(0)  # — это команда корутине «Дай поработать другим!» https://devman.org/encyclopedia/async_python/coroutines/
-    return [word for word in splitted if word]
+    return words
+
+
+def analyze_text(morph, charged_words, text, deadline=None):
+    """Возвращает желтушность и количество слов текста."""
+    score = _as_charged_dictionary(charged_words).score(
+        iter_normalized_words(morph, text, deadline))
+    return score.rate, score.words_count
+
+
+def analyze_text_by_phases(morph, charged_words, text, deadline=None):
+    """Как analyze_text, но этапы идут по очереди и замеряются.
+
+    Возвращает ((желтушность, количество слов), {этап: секунды}) для этапов
+    tokenize, lemmatize и score."""
+    timings = dict()
+    started = time.perf_counter()
+    words = list(tokenize(text))
+    timings['tokenize'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    normalized_words = list(normalize_words(morph, words, deadline))
+    timings['lemmatize'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    score = _as_charged_dictionary(charged_words).score(normalized_words)
+    timings['score'] = time.perf_counter() - started
+    return (score.rate, score.words_count), timings
+
+
+def init_analysis_worker(charged_words, lemma_cache_size=LEMMA_CACHE_SIZE,
+                         lemma_warmup_file=None):
+    """Готовит процесс пула: свой MorphAnalyzer загружается один раз."""
+    morph = get_morph_analyzer()
+    configure_lemma_cache(lemma_cache_size)
+    if lemma_warmup_file:
+        warm_up_lemma_cache(morph, lemma_warmup_file)
+    _worker_state['morph'] = morph
+    _worker_state['charged_words'] = charged_words
+
+
+def analyze_text_in_worker(text, deadline=None):
+    return analyze_text(_worker_state['morph'],
+                        _worker_state['charged_words'], text, deadline)
+
+
+def analyze_text_by_phases_in_worker(text, deadline=None):
+    return analyze_text_by_phases(_worker_state['morph'],
+                                  _worker_state['charged_words'], text,
+                                  deadline)
+
+
+class ChargedDictionary:
+    """Словари "заряженных" слов, собранные один раз при старте."""
+
+    def __init__(self, negative_words, positive_words=()):
+        self.negative_words = frozenset(negative_words)
+        self.positive_words = frozenset(positive_words)
+        self.words = self.negative_words | self.positive_words
+
+    @classmethod
+    def from_folder(cls, folder_name):
+        words = _read_charged_words(folder_name)
+        return cls(words['negative'], words['positive'])
+
+    @classmethod
+    def from_snapshot(cls, folder_name, snapshot_path, morph=None):
+        """Словари с нормализованными словами из снимка snapshot_path.
+
+        Если снимка нет или файлы словарей изменились, словари собираются
+        заново и снимок перезаписывается. MorphAnalyzer нужен только для
+        пересборки."""
+        sources = _read_charged_sources(folder_name)
+        fingerprint = _get_charged_fingerprint(sources)
+        snapshot = _load_charged_snapshot(snapshot_path, fingerprint)
+        if snapshot is not None:
+            return cls(snapshot['negative'], snapshot['positive'])
+
+        words = _parse_charged_sources(sources)
+        dictionary = cls(words['negative'], words['positive']).normalized(
+            morph or get_morph_analyzer())
+        _save_charged_snapshot(snapshot_path, fingerprint, dictionary)
+        return dictionary
+
+    def normalized(self, morph):
+        """Добавляет к словам их нормальные формы, чтобы словоформы из
+        словарей совпадали с нормализованными словами статей."""
+        return ChargedDictionary(
+            _normalize_charged_words(morph, self.negative_words),
+            _normalize_charged_words(morph, self.positive_words))
+
+    def __contains__(self, word):
+        return word in self.words
+
+    def __len__(self):
+        return len(self.words)
+
+    def score(self, article_words):
+        """Считает желтушность за один проход по словам статьи."""
+        words_count = negative_count = positive_count = 0
+        for word in article_words:
+            words_count += 1
+            if word in self.negative_words:
+                negative_count += 1
+            elif word in self.positive_words:
+                positive_count += 1
+        if not words_count:
+            return JaundiceScore(0.0, 0.0, 0.0, 0)
+        return JaundiceScore(
+            _percent(negative_count + positive_count, words_count),
+            _percent(negative_count, words_count),
+            _percent(positive_count, words_count),
+            words_count)
+
+
+def _read_charged_sources(folder_name):
+    sources = dict()
+    for tone in CHARGED_DICT_TONES:
+        _filepath = os.path.join(folder_name, f'{tone}_words.txt')
+        with open(_filepath, encoding='utf8') as f:
+            sources[tone] = f.read()
+    return sources
+
+
+def _parse_charged_sources(sources):
+    return {tone: [line.strip() for line in text.splitlines() if line.strip()]
+            for tone, text in sources.items()}
+
+
+def _read_charged_words(folder_name):
+    return _parse_charged_sources(_read_charged_sources(folder_name))
+
+
+def _normalize_charged_words(morph, words):
+    normalized_words = set()
+    for word in words:
+        word = word.lower()
+        normalized_words.add(word)
+        normalized_words.add(get_normal_form(morph, word))
+    return normalized_words
+
+
+def _get_charged_fingerprint(sources):
+    fingerprint = hashlib.sha256()
+    fingerprint.update(f'{CHARGED_DICT_SNAPSHOT_VERSION} '
+                       f'{pymorphy2.__version__}'.encode())
+    for tone in CHARGED_DICT_TONES:
+        fingerprint.update(sources[tone].encode())
+    return fingerprint.hexdigest()
+
+
+def _load_charged_snapshot(snapshot_path, fingerprint):
+    if not snapshot_path:
+        return None
+    try:
+        with open(snapshot_path, encoding='utf8') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(snapshot, dict) or \
+            snapshot.get('fingerprint') != fingerprint:
+        return None
+    return snapshot
+
+
+def _save_charged_snapshot(snapshot_path, fingerprint, dictionary):
+    if not snapshot_path:
+        return
+    snapshot = {'fingerprint': fingerprint,
+                'negative': sorted(dictionary.negative_words),
+                'positive': sorted(dictionary.positive_words)}
+    temp_path = f'{snapshot_path}.{os.getpid()}.tmp'
+    try:
+        with open(temp_path, 'w', encoding='utf8') as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(temp_path, snapshot_path)
+    except OSError:
+        logging.warning(f' Charged dictionary snapshot not saved: '
+                        f'{snapshot_path}')
+
+
+def _percent(part, total):
+    return round(part / total * 100, 2)
+
+
+def _as_charged_dictionary(charged_words):
+    if isinstance(charged_words, ChargedDictionary):
+        return charged_words
+    return ChargedDictionary(charged_words)
 
 
 def calculate_jaundice_rate(article_words, charged_words):
     """Расчитывает желтушность текста,
     принимает список "заряженных" слов и ищет их внутри article_words."""
-
-    if not article_words:
-        return 0.0
-
-    found_charged_words = [word for word in article_words if
-                           word in set(charged_words)]
-    score = len(found_charged_words) / len(article_words) * 100
-    return round(score, 2)
+    return _as_charged_dictionary(charged_words).score(article_words).rate
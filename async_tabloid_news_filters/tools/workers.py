@@ -0,0 +1,139 @@
+import logging
+import multiprocessing
+import signal
+import socket
+import time
+from multiprocessing.connection import wait
+
+READY_TIMEOUT = 120
+READY_POLL_INTERVAL = 0.1
+RESTART_DELAY = 1
+
+
+def create_listening_socket(host, port, backlog=128):
+    """Bound socket to be inherited by forked workers."""
+    family, type_, proto, _, address = socket.getaddrinfo(
+        host, port, type=socket.SOCK_STREAM, flags=socket.AI_PASSIVE)[0]
+    sock = socket.socket(family, type_, proto)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(address)
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(target, ready):
+    for signum in (signal.SIGHUP, signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, signal.SIG_DFL)
+    target(ready)
+
+
+class WorkerPool:
+    """Pre-fork master: keeps workers processes running target(ready),
+    target sets the ready event once it serves requests.
+
+    Workers that die are restarted. SIGHUP starts a new set of workers and
+    stops the old ones when all the new are ready; if a new worker exits or
+    is not ready within ready_timeout, the new set is stopped and the old
+    one keeps serving. Workers are forked from the master, so a reload
+    loads the dictionaries again but not new code or arguments.
+    SIGTERM and SIGINT stop all. A worker is stopped with SIGTERM and has
+    shutdown_timeout to finish in-flight requests before it is killed."""
+
+    def __init__(self, target, workers, shutdown_timeout,
+                 ready_timeout=READY_TIMEOUT):
+        self._context = multiprocessing.get_context('fork')
+        self._target = target
+        self._workers_count = workers
+        self._shutdown_timeout = shutdown_timeout
+        self._ready_timeout = ready_timeout
+        self._workers = list()
+        self._retiring = dict()
+        self._reload_requested = self._stop_requested = False
+
+    def _start_worker(self):
+        ready = self._context.Event()
+        process = self._context.Process(target=_run_worker,
+                                        args=(self._target, ready))
+        process.start()
+        process.ready = ready
+        return process
+
+    def _start_workers(self):
+        return [self._start_worker() for _ in range(self._workers_count)]
+
+    def _retire(self, workers):
+        kill_at = time.monotonic() + self._shutdown_timeout + 5
+        for process in workers:
+            process.terminate()
+            self._retiring[process] = kill_at
+
+    def _reap_retiring(self):
+        now = time.monotonic()
+        for process, kill_at in list(self._retiring.items()):
+            if process.is_alive() and now > kill_at:
+                logging.warning(f' Worker {process.pid} killed on shutdown')
+                process.kill()
+            if not process.is_alive():
+                process.join()
+                del self._retiring[process]
+
+    def _wait_ready(self, workers):
+        """True once all workers are ready, False as soon as one of them
+        exits, on timeout or on stop."""
+        ready_until = time.monotonic() + self._ready_timeout
+        while time.monotonic() < ready_until and not self._stop_requested:
+            if not all(process.is_alive() for process in workers):
+                return False
+            if all(process.ready.is_set() for process in workers):
+                return True
+            wait([process.sentinel for process in workers],
+                 timeout=READY_POLL_INTERVAL)
+        return False
+
+    def _reload(self):
+        logging.info(' Reloading workers')
+        new_workers = self._start_workers()
+        if not self._wait_ready(new_workers):
+            logging.error(' New workers failed to start, keeping the old ones')
+            self._retire(new_workers)
+            return
+        self._retire(self._workers)
+        self._workers = new_workers
+
+    def _restart_dead_workers(self):
+        for number, process in enumerate(self._workers):
+            if not process.is_alive():
+                process.join()
+                logging.warning(f' Worker {process.pid} exited with '
+                                f'{process.exitcode}, restarting')
+                time.sleep(RESTART_DELAY)
+                self._workers[number] = self._start_worker()
+
+    def _request_reload(self, signum, frame):
+        self._reload_requested = True
+
+    def _request_stop(self, signum, frame):
+        self._stop_requested = True
+
+    def run(self):
+        signal.signal(signal.SIGHUP, self._request_reload)
+        signal.signal(signal.SIGINT, self._request_stop)
+        signal.signal(signal.SIGTERM, self._request_stop)
+        self._workers = self._start_workers()
+        logging.info(f' Started {len(self._workers)} workers')
+        while not self._stop_requested:
+            if self._reload_requested:
+                self._reload_requested = False
+                self._reload()
+            wait([process.sentinel for process in self._workers +
+                  list(self._retiring)], timeout=1)
+            self._reap_retiring()
+            if not self._stop_requested:
+                self._restart_dead_workers()
+
+        logging.info(' Stopping workers')
+        self._retire(self._workers)
+        while self._retiring:
+            wait([process.sentinel for process in self._retiring], timeout=1)
+            self._reap_retiring()